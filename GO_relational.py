@@ -9,33 +9,27 @@ Descripton:
 
 """
 
-import pandas as pd
-from obo_funs import read_obo
+from settings import load_settings, ontology_destination
 
 
-def write_go_to_tsv(path_name):
+def write_go_to_tsv(path_name, settings=None):
     """ Write Go.tsv file """
-    graph = read_obo("http://current.geneontology.org/ontology/go.obo",
-                     "networkx")
-
-    rows = []
-    for node in graph.nodes():
-        dict_ = graph.node.get(node)
-        rows.append({"id": node,
-                     "name": dict_.get('name'),
-                     "def": dict_.get('def'),
-                     "namespace": dict_.get('namespace')})
-    dataframe = pd.DataFrame(rows)
+    from obo_funs import read_obo
+
+    if settings is None:
+        settings = load_settings()
+
+    terms, _ = read_obo(settings.obo_url, "frame")
+
+    # Skip obsolete terms, as read_obo_nx does
+    dataframe = terms.loc[terms['is_obsolete'] != 'true',
+                          ['id', 'name', 'def', 'namespace']]
     dataframe[['id', 'name', 'namespace', 'def']].to_csv(path_name, sep='\t',
                                                          index=False)
-    dataframe.to_gbq(destination_table=DESTINATION_TABLE, project_id=PROJECT,
-                     if_exists='replace')
+    dataframe.to_gbq(destination_table=ontology_destination(settings),
+                     project_id=settings.project, if_exists='replace')
 
 
 if __name__ == '__main__':
-    FILENAME = "GO.tsv"
-    PROJECT = 'tellic-dev'
-    DATASET = 'GeneOntology'
-    TABLE = 'GO_relational'
-    DESTINATION_TABLE = (DATASET + '.' + TABLE)
-    write_go_to_tsv(FILENAME)
+    SETTINGS = load_settings()
+    write_go_to_tsv(SETTINGS.ontology_file, SETTINGS)
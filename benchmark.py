@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Offline benchmark suite for the OBO and GAF code paths. Inputs come from the
+deterministic generators in synthetic.py, so runs only differ by code and
+machine. Each benchmark reports the best wall time of --repeat runs, items
+per second and peak traced memory.
+
+Results can be stored as a baseline and later runs compared against it;
+the exit status is 1 when any benchmark is slower than the baseline by more
+than --tolerance, or fails. A failing benchmark is reported and skipped,
+the others still run.
+
+Usage:
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json
+    python benchmark.py --only obo_parse,graph_build --obo-terms 50000
+"""
+
+import argparse
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import synthetic
+from settings import DEFAULTS
+
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'setup', 'run'])
+
+# Lines per GAF batch in goa.main
+BATCH_LINES = DEFAULTS['num_lines']
+
+
+# --- Benchmarks ---------------------------------------------------------------
+#
+# setup(data) prepares inputs outside of the timed region and returns the
+# argument handed to run(arg); run returns the number of items processed.
+
+
+def _obo_lines(data):
+    with open(data['obo']) as f_in:
+        return f_in.readlines()
+
+
+def run_obo_parse(lines):
+    from obo_funs import get_sections
+    typedefs, terms, instances, header = get_sections(iter(lines))
+    return len(terms)
+
+
+def _tag_lines(data):
+    return [line for line in _obo_lines(data)
+            if line.strip() and not line.startswith('[')]
+
+
+def run_parse_tag_line(lines):
+    from obo_funs import parse_tag_line
+    for line in lines:
+        parse_tag_line(line)
+    return len(lines)
+
+
+def run_graph_build(path):
+    from obo_funs import read_obo_nx
+    return len(read_obo_nx(path))
+
+
+def run_obo_frame(path):
+    from obo_funs import read_obo_frame
+    terms, children = read_obo_frame(path)
+    return len(terms)
+
+
+def _graph(data):
+    from obo_funs import read_obo_nx
+    return read_obo_nx(data['obo']), data['workdir']
+
+
+def run_export_json(arg):
+    from obo_funs import save_json_nx
+    graph, workdir = arg
+    save_json_nx(graph, os.path.join(workdir, 'graph.json'))
+    return len(graph)
+
+
+def run_export_binary(arg):
+    from obo_funs import save_binary_nx
+    graph, workdir = arg
+    save_binary_nx(graph, os.path.join(workdir, 'graph.bin'))
+    return len(graph)
+
+
+def _binary_graph(data):
+    from obo_funs import read_obo_nx, save_binary_nx
+    path = os.path.join(data['workdir'], 'graph_load.bin')
+    save_binary_nx(read_obo_nx(data['obo']), path)
+    return path
+
+
+def run_load_binary(path):
+    from obo_funs import read_binary_nx
+    return len(read_binary_nx(path))
+
+
+def _extracted_gaf(data):
+    path = os.path.join(data['workdir'], 'extracted.gaf')
+    if not os.path.exists(path):
+        from goa import open_text
+        with open_text(data['gaf']) as f_in, open(path, 'w') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    return path
+
+
+def run_gaf_batches(path):
+    """
+    The goa.main chunk loop: split, then goa.load_lines up to the BigQuery
+    load (read_csv + to_csv)
+    """
+    from goa import create_text_block, read_text_block
+    from pipeline_metrics import PipelineMetrics
+
+    metrics = PipelineMetrics('benchmark', path=os.devnull)
+    rows = 0
+    with open(path) as f_in:
+        while True:
+            block = create_text_block(f_in, BATCH_LINES)
+            if not os.path.getsize(block):
+                os.remove(block)
+                break
+            dataframe = read_text_block(block, metrics)
+            os.remove(block)
+            os.remove('new.csv')
+            rows += len(dataframe)
+    return rows
+
+
+def run_gaf_store_build(data):
+    from goa_store import build_store_from_gaf
+    return build_store_from_gaf(data['gaf'],
+                                os.path.join(data['workdir'], 'bench.gafdb'))
+
+
+BENCHMARKS = [
+    Benchmark('obo_parse', _obo_lines, run_obo_parse),
+    Benchmark('parse_tag_line', _tag_lines, run_parse_tag_line),
+    Benchmark('graph_build', lambda data: data['obo'], run_graph_build),
+    Benchmark('obo_frame', lambda data: data['obo'], run_obo_frame),
+    Benchmark('export_json', _graph, run_export_json),
+    Benchmark('export_binary', _graph, run_export_binary),
+    Benchmark('load_binary', _binary_graph, run_load_binary),
+    Benchmark('gaf_batches', _extracted_gaf, run_gaf_batches),
+    Benchmark('gaf_store_build', lambda data: data, run_gaf_store_build),
+]
+
+
+# --- Runner -------------------------------------------------------------------
+
+
+def measure(benchmark, data, repeat):
+    """Return the result dict for one benchmark"""
+    arg = benchmark.setup(data)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = benchmark.run(arg)
+        timings.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run, tracemalloc skews timings
+    tracemalloc.start()
+    try:
+        benchmark.run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(timings)
+    return {'seconds': round(best, 6),
+            'items': items,
+            'items_per_sec': round(items / best, 2) if best else None,
+            'peak_mb': round(peak / 1024.0 / 1024.0, 3)}
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table, return the names of regressed benchmarks"""
+    regressions = []
+    print('{:<18} {:>10} {:>10} {:>8}'.format('benchmark', 'baseline',
+                                               'current', 'ratio'))
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print('{:<18} {:>10} {:>10.4f} {:>8}'.format(
+                name, '-', result['seconds'], 'new'))
+            continue
+        ratio = result['seconds'] / reference['seconds']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  SLOWER'
+        print('{:<18} {:>10.4f} {:>10.4f} {:>8.2f}{}'.format(
+            name, reference['seconds'], result['seconds'], ratio, flag))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage:')[0],
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--obo-terms', type=int, default=20000)
+    parser.add_argument('--gaf-rows', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='comma separated benchmark names')
+    parser.add_argument('--baseline', help='compare against this JSON file')
+    parser.add_argument('--save-baseline', help='write results to this file')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed slowdown ratio before failing')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {'obo_terms': args.obo_terms, 'gaf_rows': args.gaf_rows,
+              'seed': args.seed}
+    selected = BENCHMARKS
+    if args.only:
+        names = set(args.only.split(','))
+        selected = [bench for bench in BENCHMARKS if bench.name in names]
+
+    workdir = tempfile.mkdtemp('_go_bench')
+    cwd = os.getcwd()
+    results = collections.OrderedDict()
+    failed = []
+    try:
+        # goa.create_text_block writes its scratch file to the cwd
+        os.chdir(workdir)
+        data = {
+            'workdir': workdir,
+            'obo': synthetic.write_obo(os.path.join(workdir, 'go.obo'),
+                                       num_terms=args.obo_terms,
+                                       seed=args.seed),
+            'gaf': synthetic.write_gaf(os.path.join(workdir, 'goa.gaf.gz'),
+                                       num_rows=args.gaf_rows,
+                                       seed=args.seed),
+        }
+        for bench in selected:
+            try:
+                results[bench.name] = measure(bench, data, args.repeat)
+            except Exception as error:
+                failed.append(bench.name)
+                print('{:<18} FAILED: {}: {}'.format(
+                    bench.name, type(error).__name__, error))
+                continue
+            print('{:<18} {seconds:>10.4f} s {items_per_sec:>14,.0f} items/s '
+                  '{peak_mb:>9.1f} MB'.format(bench.name,
+                                               **results[bench.name]))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    status = 1 if failed else 0
+    if args.baseline:
+        with open(args.baseline) as f_in:
+            baseline = json.load(f_in)
+        if baseline.get('config') != config:
+            print('Warning: baseline was recorded with {}'.format(
+                baseline.get('config')))
+        if compare(results, baseline['results'], args.tolerance):
+            status = 1
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f_out:
+            json.dump({'config': config, 'python': sys.version.split()[0],
+                       'results': results}, f_out, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Helpers shared by the memory-mapped binary formats (obo_funs.BinaryGraph,
+goa_store.GafStore, generif.GeneIdIndex).
+
+Each file is a fixed header followed by sections written back to back. All
+integers are little-endian uint32 and every section is padded to 4 bytes,
+so uint32 sections can be cast in place on little-endian machines.
+"""
+
+import array
+import mmap
+import sys
+
+
+def pad(n):
+    """Number of padding bytes that align n to 4 bytes"""
+    return -n % 4
+
+
+def uint32_bytes(values):
+    """Serialize integers as a little-endian uint32 section"""
+    arr = array.array('I', values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def uint32_array(data):
+    """Decode a little-endian uint32 section into an array"""
+    arr = array.array('I', bytes(data))
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr
+
+
+class MappedSections(object):
+    """
+    Read-only memory map of a binary file, read front to back: unpack the
+    header, then take one section after the other. Sections are views into
+    the map, nothing is copied on little-endian machines.
+    """
+
+    def __init__(self, path):
+        with open(str(path), 'rb') as f_in:
+            self._mmap = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._mmap)
+        self.offset = 0
+        self._sections = []
+
+    def header(self, header_struct):
+        """Unpack header_struct at the current offset"""
+        values = header_struct.unpack_from(self.view, self.offset)
+        self.offset += header_struct.size
+        return values
+
+    def bytes_section(self, length):
+        """Return the next section of length bytes"""
+        start = self.offset
+        self.offset += length + pad(length)
+        section = self.view[start:start + length]
+        self._sections.append(section)
+        return section
+
+    def uint32_section(self, count):
+        """Return the next section of count uint32 values"""
+        section = self.bytes_section(4 * count)
+        if sys.byteorder == 'little':
+            section = section.cast('I')
+            self._sections.append(section)
+            return section
+        return uint32_array(section)
+
+    def close(self):
+        for section in reversed(self._sections):
+            section.release()
+        self.view.release()
+        self._mmap.close()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+GOAL: Put GeneRIF (the +1Data) in BigQuery, joined to the GO annotations
+
+Description:
+This script streams generifs_basic.gz from:
+https://ftp.ncbi.nih.gov/gene/GeneRIF/
+keeps the human rows and joins them on NCBI Gene ID to the human GO
+annotations, producing one row per GeneRIF with the gene's UniProt ids and
+GO terms.
+
+The join itself reads both lookups from disk:
+    * Gene ID -> UniProt accessions comes from a prebuilt, memory-mapped
+      index (GeneIdIndex) made from the UniProt idmapping file; only the
+      GeneID rows of one organism are held while it is built
+    * UniProt accession -> GO terms comes from a GafStore (goa_store.py)
+      built from goa_human.gaf.gz with only the STORE_COLUMNS the join
+      reads, which are held in memory while the store is built
+    * GeneRIF rows are read, joined and loaded batch by batch with the
+      goa.py helpers (open_text, batched, load_rows)
+"""
+
+import functools
+import os
+import struct
+import tempfile
+
+from binary_sections import MappedSections, uint32_bytes
+from goa import LOGGER, batched, load_rows, open_text
+from goa_download import download_file
+from goa_store import GafStore, build_store_from_gaf
+from pipeline_metrics import PipelineMetrics
+from settings import generif_destination, load_settings
+
+
+# Per-stage metrics, see pipeline_metrics.py
+METRICS = PipelineMetrics('generif')
+
+GENERIF_COLUMNS = ['tax_id', 'gene_id', 'pubmed_ids', 'last_update',
+                   'generif_text']
+
+OUTPUT_COLUMNS = ['tax_id', 'gene_id', 'db_object_id', 'db_object_symbol',
+                  'go_id', 'pubmed_ids', 'last_update', 'generif_text']
+
+# GAF columns kept in the GafStore, db_object_id is the only lookup and
+# qualifier is needed to leave out NOT annotations
+STORE_COLUMNS = ['db_object_id', 'db_object_symbol', 'qualifier', 'go_id']
+STORE_INDEXES = ['db_object_id']
+
+INDEX_MAGIC = b'GIDX'
+INDEX_HEADER = struct.Struct('<4sI')
+
+# Genes whose GO terms are kept in memory while streaming
+JOIN_CACHE_SIZE = 65536
+
+
+def read_generif_rows(f_in, taxon=None):
+    """Yield the GENERIF_COLUMNS of each line, optionally for one taxon"""
+    num_columns = len(GENERIF_COLUMNS)
+    for line in f_in:
+        if line[0] == '#' or not line.strip():
+            continue
+        row = line.rstrip('\r\n').split('\t', num_columns - 1)
+        if len(row) < num_columns:
+            LOGGER.warning("Skipping malformed GeneRIF line: %s", line[:80])
+            continue
+        if taxon is not None and row[0] != taxon:
+            continue
+        yield row
+
+
+# --- Gene ID index -----------------------------------------------------------
+
+
+def read_idmapping_gene_ids(f_in):
+    """Yield (gene_id, accession) pairs from a UniProt idmapping.dat file"""
+    for line in f_in:
+        accession, id_type, value = line.rstrip('\r\n').split('\t')[:3]
+        if id_type == 'GeneID' and value.isdigit():
+            yield int(value), accession
+
+
+def build_gene_index(pairs, index_path):
+    """
+    Write a GeneIdIndex from (gene_id, accession) pairs and return the
+    number of genes. Only the per-organism mapping is held in memory.
+    """
+    accessions = {}
+    for gene_id, accession in pairs:
+        accessions.setdefault(gene_id, []).append(accession)
+
+    gene_ids = sorted(accessions)
+    offsets = [0]
+    blobs = []
+    for gene_id in gene_ids:
+        blob = '|'.join(sorted(set(accessions[gene_id]))).encode('utf-8')
+        blobs.append(blob)
+        offsets.append(offsets[-1] + len(blob))
+
+    with open(str(index_path), 'wb') as f_out:
+        f_out.write(INDEX_HEADER.pack(INDEX_MAGIC, len(gene_ids)))
+        f_out.write(uint32_bytes(gene_ids))
+        f_out.write(uint32_bytes(offsets))
+        f_out.write(b''.join(blobs))
+
+    return len(gene_ids)
+
+
+class GeneIdIndex(object):
+    """
+    NCBI Gene ID -> UniProt accessions lookup. The sorted gene ids are read
+    once; accession lists are decoded from the mapped file on demand.
+    """
+
+    def __init__(self, path):
+        self._file = MappedSections(path)
+        magic, self.num_genes = self._file.header(INDEX_HEADER)
+        if magic != INDEX_MAGIC:
+            raise ValueError('{} is not a gene id index'.format(path))
+        self._keys = self._file.uint32_section(self.num_genes)
+        self._starts = self._file.uint32_section(self.num_genes + 1)
+        self._blob = self._file.bytes_section(self._starts[-1])
+
+    def __len__(self):
+        return self.num_genes
+
+    def get(self, gene_id):
+        """Return the UniProt accessions of gene_id (an int or a str)"""
+        gene_id = int(gene_id)
+        keys = self._keys
+        low, high = 0, self.num_genes
+        while low < high:
+            mid = (low + high) // 2
+            if keys[mid] < gene_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.num_genes or keys[low] != gene_id:
+            return []
+        start, end = self._starts[low], self._starts[low + 1]
+        return str(self._blob[start:end], 'utf-8').split('|')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# --- Join --------------------------------------------------------------------
+
+
+class GeneAnnotationJoin(object):
+    """Gene ID -> (accessions, symbols, GO ids), with a bounded cache"""
+
+    def __init__(self, gene_index, store, cache_size=JOIN_CACHE_SIZE):
+        self.gene_index = gene_index
+        self.store = store
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, gene_id):
+        accessions = self.gene_index.get(gene_id)
+        row_ids = []
+        for accession in accessions:
+            row_ids.extend(self.store.lookup('db_object_id', accession))
+        # NOT annotations say the gene lacks the term
+        row_ids = self.store.positive(row_ids)
+        symbols = self.store.distinct('db_object_symbol', row_ids)
+        go_ids = self.store.distinct('go_id', row_ids)
+        return '|'.join(accessions), '|'.join(symbols), '|'.join(go_ids)
+
+    def join(self, rows):
+        """Yield OUTPUT_COLUMNS rows for GeneRIF rows with GO annotations"""
+        for tax_id, gene_id, pubmed_ids, last_update, text in rows:
+            accessions, symbols, go_ids = self.lookup(gene_id)
+            if not go_ids:
+                continue
+            yield [tax_id, gene_id, accessions, symbols, go_ids,
+                   pubmed_ids.replace(',', '|'), last_update, text]
+
+
+def stream_join(generif_path, gene_index, store, batch_size, taxon=None):
+    """Yield batches of joined rows from a (gzipped) generifs_basic file"""
+    joiner = GeneAnnotationJoin(gene_index, store)
+    with open_text(generif_path) as f_in:
+        rows = read_generif_rows(f_in, taxon)
+        for batch in batched(joiner.join(rows), batch_size):
+            yield batch
+
+
+def _download(url, temp_dir):
+    dest = os.path.join(temp_dir, url.split('/')[-1])
+    with METRICS.stage('download') as stage:
+        download_file(url, dest)
+        stage.add(num_bytes=os.path.getsize(dest))
+    return dest
+
+
+@METRICS.timed
+def main(settings=None):
+    """
+    Download GeneRIF, the UniProt id mapping and the human GAF file, build
+    the gene index and annotation store, then stream the join to BigQuery
+    """
+    if settings is None:
+        settings = load_settings()
+    temp_dir = tempfile.mkdtemp('_generif')
+
+    idmapping_path = _download(settings.idmapping_url, temp_dir)
+    index_path = os.path.join(temp_dir, 'gene_ids.idx')
+    with METRICS.stage('parse') as stage:
+        with open_text(idmapping_path) as f_in:
+            num_genes = build_gene_index(read_idmapping_gene_ids(f_in),
+                                         index_path)
+        stage.add(num_genes)
+    os.remove(idmapping_path)
+
+    gaf_path = _download(settings.goa_url, temp_dir)
+    store_path = os.path.join(temp_dir, 'annotations.gafdb')
+    with METRICS.stage('parse') as stage:
+        stage.add(build_store_from_gaf(gaf_path, store_path,
+                                       STORE_INDEXES, STORE_COLUMNS))
+    os.remove(gaf_path)
+
+    generif_path = _download(settings.generif_url, temp_dir)
+    rows_written = 0
+    with GeneIdIndex(index_path) as gene_index, \
+            GafStore(store_path) as store:
+        batches = stream_join(generif_path, gene_index, store,
+                              settings.num_lines, settings.taxon)
+        for batch in batches:
+            load_rows(batch, OUTPUT_COLUMNS, generif_destination(settings),
+                      settings.project, METRICS)
+            rows_written += len(batch)
+            LOGGER.info("%d GeneRIF rows written", rows_written)
+
+    for path in (generif_path, index_path, store_path):
+        os.remove(path)
+    os.rmdir(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
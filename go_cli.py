@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Single entry point for the Gene Ontology pipeline.
+
+    fetch            download GAF archives to a local directory
+    sync             download, extract and upload every human GAF to GCS
+    ingest-gaf       download one GAF, upload it to GCS and load BigQuery
+    export-ontology  write go.obo terms to a TSV and BigQuery
+    ingest-generif   join human GeneRIFs to GO annotations in BigQuery
+
+Settings default to settings.py, can be overridden with GO_* environment
+variables and then with the flags below. pandas, networkx and google.cloud
+are only imported by the subcommands that need them, so --dry-run, --help
+and fetch --list start in a fraction of a second.
+
+Usage:
+    python go_cli.py fetch --list
+    python go_cli.py --num-lines 100000 ingest-gaf --url URL
+    python go_cli.py --dry-run export-ontology
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from settings import DEFAULTS, load_settings
+
+
+def cmd_fetch(args, settings):
+    """Download GAF archives (segmented, see goa_download.py)"""
+    from goa_upload_only import goa_files
+
+    if args.list:
+        for url in goa_files(settings.goa_index_url):
+            print(url)
+        return 0
+    urls = args.urls or [settings.goa_url]
+    if args.all:
+        urls = list(goa_files(settings.goa_index_url))
+
+    from goa_download import download_file
+
+    for url in urls:
+        dest = os.path.join(args.dest, url.split('/')[-1])
+        download_file(url, dest, segments=args.segments)
+        print(dest)
+    return 0
+
+
+def cmd_sync(args, settings):
+    """Mirror the human GAF files to GCS"""
+    from goa_upload_only import run
+    run(settings)
+    return 0
+
+
+def cmd_ingest_gaf(args, settings):
+    """Load one GAF file into BigQuery"""
+    from goa import main
+    main(settings, delta=args.delta)
+    return 0
+
+
+def cmd_export_ontology(args, settings):
+    """Export go.obo terms"""
+    from GO_relational import write_go_to_tsv
+    write_go_to_tsv(settings.ontology_file, settings)
+    return 0
+
+
+def cmd_ingest_generif(args, settings):
+    """Load GeneRIF joined to the human GO annotations"""
+    from generif import main
+    main(settings)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('Usage:')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the resolved settings and exit')
+    for name in DEFAULTS:
+        parser.add_argument('--' + name.replace('_', '-'),
+                            dest=name, metavar=name.upper(),
+                            help='default: {} (GO_{})'.format(
+                                DEFAULTS[name], name.upper()))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    fetch = subparsers.add_parser('fetch', help=cmd_fetch.__doc__)
+    sources = fetch.add_mutually_exclusive_group()
+    sources.add_argument('urls', nargs='*', default=[],
+                         help='default: GOA_URL')
+    sources.add_argument('--all', action='store_true',
+                         help='every human GAF listed at GOA_INDEX_URL')
+    fetch.add_argument('--list', action='store_true',
+                       help='only list the available GAF files')
+    fetch.add_argument('--dest', default='.')
+    fetch.add_argument('--segments', type=int, default=8)
+    fetch.set_defaults(func=cmd_fetch)
+
+    sync = subparsers.add_parser('sync', help=cmd_sync.__doc__)
+    sync.set_defaults(func=cmd_sync)
+
+    ingest = subparsers.add_parser('ingest-gaf', help=cmd_ingest_gaf.__doc__)
+    ingest.add_argument('--url', help='default: GOA_URL')
+    ingest.add_argument('--delta', action='store_true',
+                        help='only load annotations added or removed since '
+                             'the last delta run into DELTA_TABLE')
+    ingest.set_defaults(func=cmd_ingest_gaf)
+
+    export = subparsers.add_parser('export-ontology',
+                                   help=cmd_export_ontology.__doc__)
+    export.add_argument('--output', help='default: ONTOLOGY_FILE')
+    export.set_defaults(func=cmd_export_ontology)
+
+    generif = subparsers.add_parser('ingest-generif',
+                                    help=cmd_ingest_generif.__doc__)
+    generif.set_defaults(func=cmd_ingest_generif)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    overrides = {name: getattr(args, name) for name in DEFAULTS}
+    # Subcommand shortcuts for the most common overrides
+    if getattr(args, 'url', None):
+        overrides['goa_url'] = args.url
+    if getattr(args, 'output', None):
+        overrides['ontology_file'] = args.output
+    settings = load_settings(**overrides)
+    if args.dry_run:
+        print(json.dumps(dict(settings._asdict(), command=args.command),
+                         indent=2))
+        return 0
+    return args.func(args, settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+In-process query layer over the parsed ontology (obo_funs.read_obo_nx) and
+GAF annotations (goa_store.GafStore). Answers descendants / ancestors of a
+term, genes annotated under a term and common ancestors, keeping recent
+results in a bounded LRU cache with a time to live.
+
+Cached results are keyed on the ontology data-version, and the cache is
+cleared whenever a graph with a different data-version or a new annotation
+store is loaded, so a new release never serves stale answers. Gene queries
+leave out NOT (negative) annotations.
+
+Edges in the graph point from child to parent (term is_a parent), so the
+descendants of a term are found by walking edges backwards.
+"""
+
+import collections
+import threading
+import time
+
+from obo_funs import read_obo_nx
+
+
+# Relationship types followed when walking the ontology
+DEFAULT_RELATIONS = ('is_a', 'part_of')
+
+
+class QueryCache(object):
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=4096, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if self.ttl is None or expires > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class OntologyQueryService(object):
+    """
+    Cached queries over an ontology graph and, optionally, a GafStore.
+
+    Parameters
+    ==========
+    graph : networkx.MultiDiGraph
+        Ontology as returned by obo_funs.read_obo_nx
+    store : goa_store.GafStore or None
+        Annotations used by the gene queries
+    relations : iterable of str or None
+        Edge keys to follow, None follows every relationship
+    maxsize, ttl :
+        Size and time to live (seconds, None for no expiry) of the cache
+    """
+
+    def __init__(self, graph, store=None, relations=DEFAULT_RELATIONS,
+                 maxsize=4096, ttl=3600):
+        self.store = None
+        self.relations = None if relations is None else frozenset(relations)
+        self.cache = QueryCache(maxsize=maxsize, ttl=ttl)
+        self.graph = None
+        self.data_version = None
+        self.set_ontology(graph)
+        self.set_store(store)
+
+    @classmethod
+    def from_obo(cls, path_or_file, **kwargs):
+        return cls(read_obo_nx(path_or_file), **kwargs)
+
+    def set_ontology(self, graph):
+        """Swap in a new graph, dropping the cache if the release changed"""
+        data_version = graph.graph.get('data-version')
+        if self.graph is not None and data_version != self.data_version:
+            self.cache.clear()
+        self.graph = graph
+        self.data_version = data_version
+
+    def set_store(self, store):
+        """Swap in a new GafStore, dropping the cache if it changed"""
+        if store is not self.store:
+            self.cache.clear()
+        self.store = store
+
+    def reload(self, path_or_file):
+        """Re-read the ontology, e.g. after a new go.obo was published"""
+        self.set_ontology(read_obo_nx(path_or_file))
+
+    def _cached(self, name, args, compute):
+        key = (self.data_version, name) + args
+        found, value = self.cache.get(key)
+        if not found:
+            value = compute()
+            self.cache.put(key, value)
+        return value
+
+    def _walk(self, term, adjacency):
+        """All terms reachable from term through the selected relations"""
+        if term not in adjacency:
+            raise KeyError('Unknown term {}'.format(term))
+        relations = self.relations
+        seen = set()
+        stack = [term]
+        while stack:
+            node = stack.pop()
+            for neighbor, keys in adjacency[node].items():
+                if neighbor in seen:
+                    continue
+                if relations is None or not relations.isdisjoint(keys):
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        seen.discard(term)
+        return frozenset(seen)
+
+    def descendants(self, term):
+        """Terms below term (more specific)"""
+        return self._cached('descendants', (term,),
+                            lambda: self._walk(term, self.graph.pred))
+
+    def ancestors(self, term):
+        """Terms above term (more general)"""
+        return self._cached('ancestors', (term,),
+                            lambda: self._walk(term, self.graph.succ))
+
+    def common_ancestors(self, terms):
+        """Terms that are ancestors of (or equal to) every term in terms"""
+        terms = tuple(sorted(set(terms)))
+
+        def compute():
+            common = None
+            for term in terms:
+                lineage = self.ancestors(term) | {term}
+                common = lineage if common is None else common & lineage
+            return frozenset(common or ())
+
+        return self._cached('common_ancestors', terms, compute)
+
+    def genes(self, term, evidence_codes=None, aspects=None):
+        """
+        db_object_ids annotated to term or any of its descendants, NOT
+        annotations excluded
+        """
+        if self.store is None:
+            raise ValueError('No annotation store configured')
+        evidence_codes = _freeze(evidence_codes)
+        aspects = _freeze(aspects)
+
+        def compute():
+            row_ids = []
+            for go_id in self.descendants(term) | {term}:
+                row_ids.extend(self.store.lookup('go_id', go_id,
+                                                 evidence_codes, aspects))
+            row_ids = self.store.positive(row_ids)
+            return frozenset(self.store.distinct('db_object_id', row_ids))
+
+        return self._cached('genes', (term, evidence_codes, aspects), compute)
+
+    # --- Batched queries -----------------------------------------------------
+
+    def descendants_many(self, terms):
+        """Return {term: descendants} for several terms"""
+        return {term: self.descendants(term) for term in set(terms)}
+
+    def ancestors_many(self, terms):
+        """Return {term: ancestors} for several terms"""
+        return {term: self.ancestors(term) for term in set(terms)}
+
+    def genes_many(self, terms, evidence_codes=None, aspects=None):
+        """Return {term: genes} for several terms"""
+        return {term: self.genes(term, evidence_codes, aspects)
+                for term in set(terms)}
+
+
+def _freeze(values):
+    """Normalize a filter argument so it can be part of a cache key"""
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return tuple(sorted(set(values)))
@@ -25,11 +25,10 @@ import locale
 import logging
 import os
 import tempfile
-import time
 import shutil
-import urllib.request
-import pandas as pd
-from google.cloud import storage
+from goa_download import download_file
+from pipeline_metrics import PipelineMetrics, profiled
+from settings import delta_destination, gaf_destination, load_settings
 
 
 # Create Logger
@@ -55,10 +54,23 @@ if LOGGER.hasHandlers():
 # Add console handler to Logger
 LOGGER.addHandler(CONSOLE_HANDLER)
 
+# Per-stage metrics, see pipeline_metrics.py
+METRICS = PipelineMetrics('goa')
+
+# GAF 2.x column layout
+GAF_COLUMNS = ['db', 'db_object_id', 'db_object_symbol', 'qualifier',
+               'go_id', 'db_reference', 'evidence_code', 'with_or_from',
+               'aspect', 'db_object_name', 'db_object_synonym',
+               'db_object_type', 'taxon', 'date', 'assigned_by',
+               'annotation_extension']
+
 
 def create_session(project, bucket_name):
     """Create GCS client"""
 
+    # Imported here so scripts that never touch GCS start quickly
+    from google.cloud import storage
+
     LOGGER.info("Creating GCS client")
     client = storage.Client(project=project)
     bucket = client.get_bucket(bucket_name)
@@ -66,20 +78,6 @@ def create_session(project, bucket_name):
     return bucket
 
 
-def timer(func):
-    """Times how long a function takes to run"""
-
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        elapse = time.time() - start
-        LOGGER.info("%s function ran in: %d sec", func.__name__, elapse)
-        print("{} function ran in: {:.2f} sec".format(func.__name__, elapse))
-        return result
-
-    return wrapper
-
-
 def get_bucket_info(upload_bucket, subdir):
     """Create client, set bucket, return bucket information"""
 
@@ -114,6 +112,39 @@ def get_bad_lines(temp_dest):
     return ignore_lines
 
 
+def open_text(path):
+    """Open a plain or gzipped text file for streaming"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def batched(rows, size):
+    """Yield lists of at most size rows from an iterable"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_gaf_rows(f_in):
+    """Yield the GAF columns of each annotation line in a text stream"""
+    num_columns = len(GAF_COLUMNS)
+    for line in f_in:
+        # Skip comments and blank lines
+        if line[0] == '!' or not line.strip():
+            continue
+
+        row = line.rstrip('\r\n').split('\t')[:num_columns]
+        if len(row) < num_columns:
+            row.extend([''] * (num_columns - len(row)))
+        yield row
+
+
 def extract_gz_file(filename, temp_dest):
     """Extact the gz file, return the file and number of lines"""
 
@@ -148,72 +179,119 @@ def create_text_block(f_in, num_lines):
     return this_file
 
 
-def load_lines(file_name):
-    """Write text block to Big Query table"""
-    LOGGER.info("Writing text block to BigQuery")
+def read_text_block(file_name, metrics=METRICS):
+    """
+    Parse a text block into a DataFrame and write it to new.csv, everything
+    load_lines does before the BigQuery load
+    """
+    import pandas as pd
 
     # Create article CSV
     csv_file = file_name
-    column_names = ['db', 'db_object_id', 'db_object_symbol', 'qualifier',
-                    'go_id', 'db_reference', 'evidence_code', 'with_or_from',
-                    'aspect', 'db_object_name', 'db_object_synonym',
-                    'db_object_type', 'taxon', 'date', 'assigned_by',
-                    'annotation_extension']
-
-    dataframe = pd.read_csv(csv_file, delimiter='\t', index_col=False,
-                            names=column_names, error_bad_lines=False,
-                            warn_bad_lines=True, skip_blank_lines=True,
-                            verbose=True)
-    dataframe.to_csv('new.csv', encoding='utf-8', index=False)
-    dataframe.to_gbq(destination_table=DESTINATION_TABLE, project_id=PROJECT, if_exists='append')
+
+    with metrics.stage('parse') as stage:
+        dataframe = pd.read_csv(csv_file, delimiter='\t', index_col=False,
+                                names=GAF_COLUMNS, on_bad_lines='warn',
+                                skip_blank_lines=True)
+        stage.add(len(dataframe), os.path.getsize(csv_file))
+    with metrics.stage('serialize', rows=len(dataframe)) as stage:
+        dataframe.to_csv('new.csv', encoding='utf-8', index=False)
+        stage.add(num_bytes=os.path.getsize('new.csv'))
+
+    return dataframe
+
+
+def load_lines(file_name, destination_table, project):
+    """Write text block to Big Query table"""
+    LOGGER.info("Writing text block to BigQuery")
+
+    dataframe = read_text_block(file_name)
+    with METRICS.stage('load', rows=len(dataframe)):
+        dataframe.to_gbq(destination_table=destination_table,
+                         project_id=project, if_exists='append')
 
     os.remove('new.csv')
 
 
-@timer
-def main():
+def load_rows(rows, column_names, destination_table, project,
+              metrics=METRICS):
+    """Append a batch of rows (lists of strings) to a Big Query table"""
+    import pandas as pd
+
+    with metrics.stage('serialize', rows=len(rows)):
+        dataframe = pd.DataFrame.from_records(rows, columns=column_names)
+    with metrics.stage('load', rows=len(rows)):
+        dataframe.to_gbq(destination_table=destination_table,
+                         project_id=project, if_exists='append')
+
+
+@METRICS.timed
+def main(settings=None, delta=False):
     """
     Create a GCS client, get a bucket object, download and extract the .gz
     file from the URL, check if the .gz file exists in GCS, upload new file to
     GCS, copy chunks of the extracted file to a text block, create a csv from
     the text block, write the csv to a BQ table, and delete local temp files
+
+    With delta=True the file is always downloaded and only the annotations
+    added or removed since the previous release are written (goa_delta.py)
     """
+    if settings is None:
+        settings = load_settings()
 
     # Set url
-    url = GOA_URL
+    url = settings.goa_url
     # Set the name of the gz file
     filename = url.split('/')[-1]
     # Set temp location for gz file
     temp_dest = tempfile.mkdtemp('_go') + '/' + filename
 
     # Create a client session and get the bucket object
-    bucket = create_session(PROJECT, BUCKET_NAME)
+    bucket = create_session(settings.project, settings.bucket_name)
 
     # Get list of objects in the bucket
-    my_dir = SUB_DIR
+    my_dir = settings.sub_dir
     blob_list = get_bucket_info(bucket, my_dir)
     LOGGER.info("GCS Bucket BLOB_LIST: %s", blob_list)
 
     # Check if file is already in GCS
-    if my_dir + '/' + filename[:-3] in blob_list:
+    if not delta and my_dir + '/' + filename[:-3] in blob_list:
         LOGGER.info("File already exists, skipping download: %s", filename[:-3])
     # Download the gz file
     else:
         LOGGER.info("Downloading file to %s", temp_dest)
-        urllib.request.urlcleanup()
-        urllib.request.urlretrieve(url, temp_dest)
+        with METRICS.stage('download') as stage:
+            download_file(url, temp_dest)
+            stage.add(num_bytes=os.path.getsize(temp_dest))
 
         # Get extracted file object and number of lines in the extracted file
-        extracted_file, total_lines = extract_gz_file(filename[:-3], temp_dest)
+        with METRICS.stage('decompress') as stage:
+            extracted_file, total_lines = extract_gz_file(filename[:-3],
+                                                          temp_dest)
+            stage.add(total_lines, os.path.getsize(extracted_file))
 
         # Copy gz file to GCS
-        copy_to_bucket(bucket, my_dir, extracted_file)
+        with METRICS.stage('upload') as stage:
+            copy_to_bucket(bucket, my_dir, extracted_file)
+            stage.add(num_bytes=os.path.getsize(extracted_file))
+
+        # Only push what changed since the previous release
+        if delta:
+            from goa_delta import delta_load
+
+            added, removed = delta_load(extracted_file, settings, METRICS,
+                                        delta_destination(settings))
+            LOGGER.info("Delta load: %d annotations added, %d removed",
+                        added, removed)
+            os.remove(temp_dest)
+            os.remove(extracted_file)
+            return
 
         # Set up variables for the while loop
-        if total_lines < NUM_LINES:
+        if total_lines < settings.num_lines:
             num_lines = total_lines
         else:
-            num_lines = NUM_LINES
+            num_lines = settings.num_lines
 
         LOGGER.info("TOTAL LINES: %d", total_lines)
         LOGGER.info("NUM LINES: %d", num_lines)
@@ -228,9 +306,14 @@ def main():
                 if to_go < num_lines:
                     num_lines = to_go
 
-                current_file = create_text_block(f_in, num_lines)
-                lines_written += len(open(current_file).readlines())
-                load_lines(current_file)
+                with profiled('gaf_batch'):
+                    with METRICS.stage('split') as stage:
+                        current_file = create_text_block(f_in, num_lines)
+                        block_lines = len(open(current_file).readlines())
+                        stage.add(block_lines)
+                    lines_written += block_lines
+                    load_lines(current_file, gaf_destination(settings),
+                               settings.project)
 
                 # Output some information about the current status
                 countdown = locale.format_string("%d", to_go, grouping=True)
@@ -250,13 +333,6 @@ if __name__ == '__main__':
     # http://current.geneontology.org/annotations/goa_human_isoform.gaf.gz
     # http://current.geneontology.org/annotations/goa_human_rna.gaf.gz
 
-    GOA_URL = 'http://current.geneontology.org/annotations/goa_human.gaf.gz'
-    PROJECT = 'tellic-dev'
-    BUCKET_NAME = 'tellic-dev'
-    SUB_DIR = 'GeneOntology'
-    DATASET = 'GeneOntology'
-    TABLE = 'GAF_files'
-    DESTINATION_TABLE = (DATASET + '.' + TABLE)
-    NUM_LINES = 50000
-
+    # Settings come from settings.py / GO_* environment variables, e.g.
+    # GO_GOA_URL=http://current.geneontology.org/annotations/goa_human_rna.gaf.gz
     main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Incremental (delta) loads of GAF releases.
+
+Every annotation is fingerprinted with a 64-bit hash over its normalized key
+columns. The fingerprints of the last loaded release are kept on disk as a
+sorted uint64 array (8 bytes per annotation). A new release is diffed
+against it with a linear merge, and only the difference reaches BigQuery:
+
+    * added annotations are first deleted from the delta table by
+      fingerprint, then appended together with their fingerprint (a 16
+      character hex string)
+    * removed annotations are deleted from the delta table by fingerprint
+
+Deleting the added fingerprints first clears whatever an earlier, failed
+run appended before it stopped, so applying the same delta twice leaves
+the table as applying it once. The fingerprint file is only replaced once
+every step succeeded, so a failed run is simply repeated the next night.
+"""
+
+import array
+import hashlib
+import os
+import struct
+import sys
+
+from goa import (GAF_COLUMNS, LOGGER, batched, load_rows, open_text,
+                 read_gaf_rows)
+
+
+# Columns that identify an annotation. Gene product metadata (name,
+# synonyms, type) and the date are left out so that metadata-only changes
+# do not show up as remove + add.
+KEY_COLUMNS = ['db', 'db_object_id', 'qualifier', 'go_id', 'db_reference',
+               'evidence_code', 'with_or_from', 'aspect', 'taxon',
+               'assigned_by', 'annotation_extension']
+
+# Pipe separated columns whose element order carries no meaning
+UNORDERED_COLUMNS = ['db_reference', 'with_or_from', 'qualifier']
+
+DELTA_COLUMNS = GAF_COLUMNS + ['fingerprint']
+
+FINGERPRINT_MAGIC = b'GAFP'
+FINGERPRINT_HEADER = struct.Struct('<4sQ')
+
+# Fingerprints per DELETE statement
+DELETE_BATCH = 10000
+
+_KEY_INDEXES = [GAF_COLUMNS.index(name) for name in KEY_COLUMNS]
+_UNORDERED = {GAF_COLUMNS.index(name) for name in UNORDERED_COLUMNS}
+
+
+def normalize(row):
+    """Return the canonical key string of a GAF row"""
+    values = []
+    for idx in _KEY_INDEXES:
+        value = row[idx].strip()
+        if idx in _UNORDERED and '|' in value:
+            value = '|'.join(sorted(value.split('|')))
+        values.append(value)
+    return '\t'.join(values)
+
+
+def fingerprint(row):
+    """64-bit fingerprint of a GAF row"""
+    digest = hashlib.blake2b(normalize(row).encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def fingerprint_hex(value):
+    return '{:016x}'.format(value)
+
+
+def fingerprint_rows(rows):
+    """Return the sorted, de-duplicated fingerprints of rows"""
+    return array.array('Q', sorted({fingerprint(row) for row in rows}))
+
+
+def save_fingerprints(fingerprints, path):
+    """Atomically write a sorted fingerprint array"""
+    temp_path = str(path) + '.tmp'
+    data = array.array('Q', fingerprints)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    with open(temp_path, 'wb') as f_out:
+        f_out.write(FINGERPRINT_HEADER.pack(FINGERPRINT_MAGIC, len(data)))
+        f_out.write(data.tobytes())
+    os.replace(temp_path, str(path))
+
+
+def load_fingerprints(path):
+    """Read a fingerprint file, an empty array if there is none yet"""
+    if not os.path.exists(str(path)):
+        return array.array('Q')
+    with open(str(path), 'rb') as f_in:
+        magic, count = FINGERPRINT_HEADER.unpack(
+            f_in.read(FINGERPRINT_HEADER.size))
+        if magic != FINGERPRINT_MAGIC:
+            raise ValueError('{} is not a fingerprint file'.format(path))
+        data = array.array('Q')
+        data.fromfile(f_in, count)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data
+
+
+def diff_fingerprints(new, old):
+    """Merge two sorted arrays, return (added, removed) arrays"""
+    added, removed = array.array('Q'), array.array('Q')
+    i, j = 0, 0
+    while i < len(new) and j < len(old):
+        if new[i] == old[j]:
+            i += 1
+            j += 1
+        elif new[i] < old[j]:
+            added.append(new[i])
+            i += 1
+        else:
+            removed.append(old[j])
+            j += 1
+    added.extend(new[i:])
+    removed.extend(old[j:])
+    return added, removed
+
+
+def delta_rows(rows, added):
+    """
+    Yield DELTA_COLUMNS rows for the annotations whose fingerprint is in
+    added, once per fingerprint
+    """
+    pending = set(added)
+    for row in rows:
+        value = fingerprint(row)
+        if value in pending:
+            pending.discard(value)
+            yield row + [fingerprint_hex(value)]
+
+
+def delete_fingerprints(fingerprints, destination_table, project):
+    """
+    Delete annotations from a BigQuery table by fingerprint. A table that
+    does not exist yet (the first delta run) has nothing to delete.
+    """
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=project)
+    try:
+        client.get_table(destination_table)
+    except NotFound:
+        LOGGER.info("%s does not exist yet, nothing to delete",
+                    destination_table)
+        return
+    query = ('DELETE FROM `{}` WHERE fingerprint IN UNNEST(@fingerprints)'
+             .format(destination_table))
+    for batch in batched((fingerprint_hex(value) for value in fingerprints),
+                         DELETE_BATCH):
+        config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter('fingerprints', 'STRING', batch)])
+        client.query(query, job_config=config).result()
+
+
+def fingerprint_path_for(gaf_path, fingerprint_dir):
+    """goa_human.gaf(.gz) -> <fingerprint_dir>/goa_human.gaf.fingerprints"""
+    name = os.path.basename(str(gaf_path))
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return os.path.join(fingerprint_dir, name + '.fingerprints')
+
+
+def delta_load(gaf_path, settings, metrics, destination_table):
+    """
+    Diff a GAF release against the previous one and push only the changes
+    to destination_table. Returns (number added, number removed).
+    """
+    fingerprint_path = fingerprint_path_for(gaf_path,
+                                            settings.fingerprint_dir)
+    with metrics.stage('parse') as stage:
+        with open_text(gaf_path) as f_in:
+            new = fingerprint_rows(read_gaf_rows(f_in))
+        stage.add(len(new))
+    with metrics.stage('diff', rows=len(new)):
+        old = load_fingerprints(fingerprint_path)
+        added, removed = diff_fingerprints(new, old)
+    LOGGER.info("Delta against %d previous annotations: %d added, "
+                "%d removed, %d unchanged", len(old), len(added),
+                len(removed), len(new) - len(added))
+
+    if added:
+        # Makes a retry after a partial append idempotent
+        with metrics.stage('load', rows=len(added)):
+            delete_fingerprints(added, destination_table, settings.project)
+        with open_text(gaf_path) as f_in:
+            rows = delta_rows(read_gaf_rows(f_in), added)
+            for batch in batched(rows, settings.num_lines):
+                load_rows(batch, DELTA_COLUMNS, destination_table,
+                          settings.project, metrics)
+    if removed:
+        with metrics.stage('load', rows=len(removed)):
+            delete_fingerprints(removed, destination_table, settings.project)
+
+    save_fingerprints(new, fingerprint_path)
+    return len(added), len(removed)
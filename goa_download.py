@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Segmented HTTP downloader for large GAF archives such as
+goa_uniprot_all.gaf.gz. The file is split into byte ranges that are fetched
+concurrently with HTTP Range requests and written in place, so one slow TCP
+stream no longer bounds the download. Failed segments are retried on their
+own, the final size (and optionally a checksum) is verified, and servers
+without Range support fall back to a single stream.
+
+Usage:
+    python goa_download.py URL DEST [SEGMENTS]
+"""
+
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+LOGGER = logging.getLogger('Gene Ontology Ingestion')
+
+SEGMENTS = 8
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+RETRIES = 3
+TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+
+
+class RangeNotSupported(Exception):
+    """Server ignored a Range request"""
+
+
+def probe(url, timeout=TIMEOUT):
+    """Return (content length or None, whether byte ranges are supported)"""
+    request = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content_range = response.headers.get('Content-Range', '')
+            match = re.match(r'bytes 0-0/(\d+)$', content_range)
+            if response.status == 206 and match:
+                return int(match.group(1)), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length else None), False
+    except urllib.error.HTTPError as error:
+        # 416 and friends: let the single stream path report real errors
+        LOGGER.debug("Range probe of %s failed: %s", url, error)
+        return None, False
+
+
+def fetch_range(url, dest, start, end, timeout=TIMEOUT):
+    """Write bytes start..end (inclusive) of url into dest at offset start"""
+    request = urllib.request.Request(
+        url, headers={'Range': 'bytes={}-{}'.format(start, end)})
+    expected = end - start + 1
+    written = 0
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if response.status != 206:
+            raise RangeNotSupported(url)
+        with open(dest, 'r+b') as f_out:
+            f_out.seek(start)
+            while written < expected:
+                chunk = response.read(min(CHUNK_SIZE, expected - written))
+                if not chunk:
+                    break
+                f_out.write(chunk)
+                written += len(chunk)
+    if written != expected:
+        raise IOError('Segment {}-{} of {} is short: {} of {} bytes'.format(
+            start, end, url, written, expected))
+
+
+def fetch_range_with_retry(url, dest, start, end, retries=RETRIES,
+                           timeout=TIMEOUT):
+    """fetch_range, retrying this segment only with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return fetch_range(url, dest, start, end, timeout)
+        except RangeNotSupported:
+            raise
+        except (IOError, OSError) as error:
+            if attempt == retries:
+                raise
+            delay = 2 ** attempt
+            LOGGER.warning("Segment %d-%d failed (%s), retrying in %d sec",
+                           start, end, error, delay)
+            time.sleep(delay)
+
+
+def fetch_single_stream(url, dest, timeout=TIMEOUT):
+    """Plain one-connection download"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        with open(dest, 'wb') as f_out:
+            shutil.copyfileobj(response, f_out, CHUNK_SIZE)
+
+
+def split_ranges(size, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    """Split size bytes into at most segments inclusive (start, end) ranges"""
+    segments = max(1, min(segments, size // max(min_segment_size, 1)))
+    step = -(-size // segments)
+    return [(start, min(start + step, size) - 1)
+            for start in range(0, size, step)]
+
+
+def file_digest(path, algorithm='md5'):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_file(url, dest, segments=SEGMENTS, checksum=None,
+                  algorithm='md5', retries=RETRIES, timeout=TIMEOUT,
+                  min_segment_size=MIN_SEGMENT_SIZE):
+    """
+    Download url to dest using up to `segments` concurrent Range requests.
+
+    Falls back to a single stream when the server does not support ranges
+    or the file is too small to be worth splitting. Raises IOError if the
+    downloaded size or `checksum` (hex digest using `algorithm`) is wrong.
+    """
+    size, accepts_ranges = probe(url, timeout)
+    ranges = split_ranges(size, segments, min_segment_size) if size else []
+
+    if accepts_ranges and len(ranges) > 1:
+        LOGGER.info("Downloading %s in %d segments", url, len(ranges))
+        with open(dest, 'wb') as f_out:
+            f_out.truncate(size)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(len(ranges)) as pool:
+                futures = [pool.submit(fetch_range_with_retry, url, dest,
+                                       start, end, retries, timeout)
+                           for start, end in ranges]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+        except RangeNotSupported:
+            LOGGER.warning("Server ignored Range for %s, using one stream",
+                           url)
+            fetch_single_stream(url, dest, timeout)
+    else:
+        LOGGER.info("Downloading %s in a single stream", url)
+        fetch_single_stream(url, dest, timeout)
+
+    actual = os.path.getsize(dest)
+    if size is not None and actual != size:
+        raise IOError('Downloaded {} bytes of {}, expected {}'.format(
+            actual, url, size))
+    if checksum is not None:
+        digest = file_digest(dest, algorithm)
+        if digest.lower() != checksum.lower():
+            raise IOError('{} checksum mismatch for {}: {} != {}'.format(
+                algorithm, url, digest, checksum))
+
+    return dest
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    download_file(sys.argv[1], sys.argv[2],
+                  *[int(arg) for arg in sys.argv[3:4]])
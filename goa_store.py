@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Local, read-only query store for GAF annotations. Answers "which terms does
+gene X have" and "which genes have term Y" from disk instead of querying the
+GAF_files table in BigQuery.
+
+The store is a single file built from the goa.py GAF stream:
+
+    header      magic, version, row/string/column counts
+    names       the stored columns and the indexed columns
+    strings     sorted, de-duplicated cell values (uint32 offsets followed
+                by a blob of NUL terminated utf-8 strings)
+    columns     one uint32 array of string ids per stored GAF column (all
+                of them unless build_store is given a subset)
+    indexes     for every indexed column, the row ids ordered by value and
+                the matching sorted value ids
+
+Because the string table is sorted, string ids compare in the same order as
+the strings themselves, so point and range lookups are binary searches over
+memory-mapped integer arrays.
+
+Usage:
+    python goa_store.py goa_human.gaf.gz goa_human.gafdb
+"""
+
+import array
+import struct
+import sys
+
+from binary_sections import MappedSections, pad, uint32_bytes
+from goa import GAF_COLUMNS, LOGGER, open_text, read_gaf_rows
+
+
+STORE_MAGIC = b'GAFS'
+STORE_VERSION = 2
+STORE_HEADER = struct.Struct('<4sHHIII')
+
+INDEXED_COLUMNS = ['db_object_id', 'db_object_symbol', 'go_id',
+                   'evidence_code']
+
+
+def build_store(rows, store_path, indexed_columns=None, columns=None):
+    """
+    Write the store for an iterable of GAF rows (see goa.read_gaf_rows) to
+    store_path and return the number of rows written. Only the GAF columns
+    named in `columns` are kept, which also bounds the memory used while
+    building.
+    """
+    column_names = list(GAF_COLUMNS if columns is None else columns)
+    if indexed_columns is None:
+        indexed_columns = [name for name in INDEXED_COLUMNS
+                           if name in column_names]
+    unknown = [name for name in column_names if name not in GAF_COLUMNS]
+    unknown += [name for name in indexed_columns if name not in column_names]
+    if unknown:
+        raise ValueError('Cannot store or index columns {}'.format(
+            ', '.join(unknown)))
+    positions = [GAF_COLUMNS.index(name) for name in column_names]
+
+    # Intern every cell value, then renumber the ids in sorted order
+    string_ids = {}
+    columns = [array.array('I') for _ in column_names]
+    for row in rows:
+        for column, position in zip(columns, positions):
+            value = row[position]
+            idx = string_ids.get(value)
+            if idx is None:
+                idx = string_ids[value] = len(string_ids)
+            column.append(idx)
+
+    strings = sorted(string_ids)
+    remap = array.array('I', bytes(4 * len(strings)))
+    for new_id, value in enumerate(strings):
+        remap[string_ids[value]] = new_id
+    del string_ids
+    for column in columns:
+        for i, idx in enumerate(column):
+            column[i] = remap[idx]
+
+    num_rows = len(columns[0])
+    LOGGER.info("Building GAF store: %d rows, %d distinct values",
+                num_rows, len(strings))
+
+    encoded = [value.encode('utf-8') + b'\0' for value in strings]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+
+    sections = [uint32_bytes(offsets), b''.join(encoded)]
+    sections.extend(uint32_bytes(column) for column in columns)
+    for name in indexed_columns:
+        column = columns[column_names.index(name)]
+        order = sorted(range(num_rows), key=column.__getitem__)
+        sections.append(uint32_bytes(order))
+        sections.append(uint32_bytes(column[i] for i in order))
+
+    # Column and index names are stored as two tab separated lines
+    names = '\n'.join(['\t'.join(column_names),
+                       '\t'.join(indexed_columns)]).encode('utf-8')
+    with open(str(store_path), 'wb') as f_out:
+        f_out.write(STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION,
+                                      len(column_names), num_rows,
+                                      len(strings), len(names)))
+        f_out.write(names + b'\0' * pad(len(names)))
+        for section in sections:
+            f_out.write(section)
+            f_out.write(b'\0' * pad(len(section)))
+
+    return num_rows
+
+
+def build_store_from_gaf(gaf_path, store_path, indexed_columns=None,
+                         columns=None):
+    """Build the store straight from a (gzipped) GAF file"""
+    with open_text(gaf_path) as f_in:
+        return build_store(read_gaf_rows(f_in), store_path, indexed_columns,
+                           columns)
+
+
+class GafStore(object):
+    """
+    Memory-mapped GAF annotation store written by build_store.
+
+    Lookups return row ids; use row/rows to decode them. Every lookup takes
+    optional evidence_codes and aspects filters. Lookups keep NOT (negative)
+    annotations, use positive() to drop them; go_terms and genes already do.
+    """
+
+    def __init__(self, path):
+        self._file = MappedSections(path)
+        (magic, version, num_columns, num_rows, num_strings,
+         names_len) = self._file.header(STORE_HEADER)
+        if magic != STORE_MAGIC:
+            raise ValueError('{} is not a GAF store'.format(path))
+        if version != STORE_VERSION:
+            raise ValueError('Unsupported GAF store version {}'.format(version))
+
+        column_names, index_names = bytes(
+            self._file.bytes_section(names_len)).decode('utf-8').split('\n')
+        self.columns = column_names.split('\t')
+        if len(self.columns) != num_columns:
+            raise ValueError('GAF store has {} columns, expected {}'.format(
+                len(self.columns), num_columns))
+        self.num_rows = num_rows
+        self.num_strings = num_strings
+        self._string_offsets = self._file.uint32_section(num_strings + 1)
+        self._blob = self._file.bytes_section(self._string_offsets[-1])
+        self._columns = {name: self._file.uint32_section(num_rows)
+                         for name in self.columns}
+        self._indexes = {}
+        for name in index_names.split('\t') if index_names else []:
+            order = self._file.uint32_section(num_rows)
+            keys = self._file.uint32_section(num_rows)
+            self._indexes[name] = (order, keys)
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def indexed_columns(self):
+        return list(self._indexes)
+
+    def string(self, idx):
+        """Decode entry idx of the string table"""
+        start = self._string_offsets[idx]
+        end = self._string_offsets[idx + 1] - 1
+        return str(self._blob[start:end], 'utf-8')
+
+    def _string_bound(self, value):
+        """Position of value in the sorted string table (bisect style)"""
+        target = value.encode('utf-8')
+        offsets = self._string_offsets
+        blob = self._blob
+        low, high = 0, self.num_strings
+        while low < high:
+            mid = (low + high) // 2
+            current = bytes(blob[offsets[mid]:offsets[mid + 1] - 1])
+            if current < target:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def string_id(self, value):
+        """Return the string id of value, or None if it is not stored"""
+        idx = self._string_bound(value)
+        if idx < self.num_strings and self.string(idx) == value:
+            return idx
+        return None
+
+    def _column(self, name):
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise KeyError('Column {} is not stored, choose from {}'.format(
+                name, ', '.join(self.columns)))
+
+    def _index(self, column):
+        try:
+            return self._indexes[column]
+        except KeyError:
+            raise KeyError('Column {} is not indexed, choose from {}'.format(
+                column, ', '.join(self._indexes)))
+
+    @staticmethod
+    def _bisect(keys, key, right=False):
+        low, high = 0, len(keys)
+        while low < high:
+            mid = (low + high) // 2
+            if keys[mid] < key or (right and keys[mid] == key):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _filter(self, row_ids, evidence_codes, aspects):
+        """Keep the rows that match the evidence code and aspect filters"""
+        for name, values in (('evidence_code', evidence_codes),
+                             ('aspect', aspects)):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            wanted = {self.string_id(value) for value in values}
+            wanted.discard(None)
+            column = self._column(name)
+            row_ids = [i for i in row_ids if column[i] in wanted]
+        return row_ids
+
+    def lookup(self, column, value, evidence_codes=None, aspects=None):
+        """Return the ids of the rows where column == value"""
+        order, keys = self._index(column)
+        key = self.string_id(value)
+        if key is None:
+            return []
+        start = self._bisect(keys, key)
+        end = self._bisect(keys, key, right=True)
+        return self._filter(sorted(order[start:end]), evidence_codes, aspects)
+
+    def range(self, column, low=None, high=None, evidence_codes=None,
+              aspects=None):
+        """
+        Return the ids of the rows where low <= column < high. Either bound
+        may be None for an open range.
+        """
+        order, keys = self._index(column)
+        low_key = 0 if low is None else self._string_bound(low)
+        high_key = (self.num_strings if high is None
+                    else self._string_bound(high))
+        start = self._bisect(keys, low_key)
+        end = self._bisect(keys, high_key)
+        return self._filter(sorted(order[start:end]), evidence_codes, aspects)
+
+    def value(self, row_id, column):
+        """Return a single cell"""
+        return self.string(self._column(column)[row_id])
+
+    def row(self, row_id):
+        """Return one annotation as a dict keyed by stored column"""
+        return {name: self.string(self._columns[name][row_id])
+                for name in self.columns}
+
+    def rows(self, row_ids):
+        """Return a list of annotations as dicts"""
+        return [self.row(row_id) for row_id in row_ids]
+
+    def distinct(self, column, row_ids):
+        """Return the sorted distinct values of column for row_ids"""
+        values = self._column(column)
+        return [self.string(idx) for idx in sorted({values[i]
+                                                    for i in row_ids})]
+
+    def positive(self, row_ids):
+        """Drop the rows whose qualifier has NOT (negative annotations)"""
+        column = self._column('qualifier')
+        negated = {}
+        kept = []
+        for i in row_ids:
+            idx = column[i]
+            is_not = negated.get(idx)
+            if is_not is None:
+                is_not = negated[idx] = 'NOT' in self.string(idx).split('|')
+            if not is_not:
+                kept.append(i)
+        return kept
+
+    def go_terms(self, gene, evidence_codes=None, aspects=None):
+        """GO ids annotated to a gene, by db_object_id or symbol"""
+        row_ids = self.lookup('db_object_id', gene, evidence_codes, aspects)
+        if not row_ids:
+            row_ids = self.lookup('db_object_symbol', gene, evidence_codes,
+                                  aspects)
+        return self.distinct('go_id', self.positive(row_ids))
+
+    def genes(self, go_id, evidence_codes=None, aspects=None):
+        """db_object_ids annotated to a GO term"""
+        row_ids = self.lookup('go_id', go_id, evidence_codes, aspects)
+        return self.distinct('db_object_id', self.positive(row_ids))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    GAF_PATH, STORE_PATH = sys.argv[1:3]
+    NUM_ROWS = build_store_from_gaf(GAF_PATH, STORE_PATH)
+    LOGGER.info("Wrote %d annotations to %s", NUM_ROWS, STORE_PATH)
@@ -23,10 +23,11 @@ import logging
 import os
 import re
 import tempfile
-import time
 import shutil
 import urllib.request
-from google.cloud import storage
+from goa_download import download_file
+from pipeline_metrics import PipelineMetrics
+from settings import load_settings
 
 
 # Create Logger
@@ -52,24 +53,16 @@ if LOGGER.hasHandlers():
 # Add console handler to Logger
 LOGGER.addHandler(CONSOLE_HANDLER)
 
-
-def timer(func):
-    """Times how long a function takes to run"""
-
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        elapse = time.time() - start
-        LOGGER.info("%s function ran in: %d sec", func.__name__, elapse)
-        print("{} function ran in: {:.2f} sec".format(func.__name__, elapse))
-        return result
-
-    return wrapper
+# Per-stage metrics, see pipeline_metrics.py
+METRICS = PipelineMetrics('goa_upload_only')
 
 
 def create_session(project, bucket_name):
     """Create GCS client"""
 
+    # Imported here so scripts that never touch GCS start quickly
+    from google.cloud import storage
+
     LOGGER.info("Creating GCS client")
     # os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = 'tellic-dev-2807ffb4dd7f.json'
     client = storage.Client(project=project)
@@ -98,7 +91,7 @@ def copy_to_bucket(filename, upload_bucket, subdir):
     blob.upload_from_filename(filename)
 
 
-def goa_file_extract(url, bucket):
+def goa_file_extract(url, bucket, my_dir):
     """
     Check if uploaded, if not download, extract to temp location, upload to GCS
     and delete local temp files
@@ -106,7 +99,6 @@ def goa_file_extract(url, bucket):
 
     filename = url.split('/')[-1]
     temp_dest = tempfile.mkdtemp('_go') + '/' + filename
-    my_dir = SUB_DIR
     blob_list = get_bucket_info(bucket, my_dir)
 
     # Check if the file has been uploaded
@@ -117,16 +109,23 @@ def goa_file_extract(url, bucket):
     # Download, extract, upload to GCS, and delete local temp files
     else:
         LOGGER.info("Downloading file to %s", temp_dest)
-        urllib.request.urlcleanup()
-        urllib.request.urlretrieve(url, temp_dest)
+        with METRICS.stage('download') as stage:
+            download_file(url, temp_dest)
+            stage.add(num_bytes=os.path.getsize(temp_dest))
+
+        with METRICS.stage('decompress') as stage:
+            with gzip.open(temp_dest) as f_in:
+                with open(filename[:-3], 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            stage.add(num_bytes=os.path.getsize(filename[:-3]))
 
-        with gzip.open(temp_dest) as f_in:
-            with open(filename[:-3], 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-                copy_to_bucket(filename[:-3], bucket, my_dir)
-                print("Out File:", filename[:-3])
-                os.remove(temp_dest)
-                os.remove(filename[:-3])
+        # Upload once the extracted file is closed and flushed
+        with METRICS.stage('upload') as stage:
+            copy_to_bucket(filename[:-3], bucket, my_dir)
+            stage.add(num_bytes=os.path.getsize(filename[:-3]))
+        print("Out File:", filename[:-3])
+        os.remove(temp_dest)
+        os.remove(filename[:-3])
 
 
 def get_files(url):
@@ -148,25 +147,23 @@ def goa_files(goa_url):
         yield goa_url + file_name
 
 
-@timer
-def run():
+@METRICS.timed
+def run(settings=None):
     """This is the main function"""
+    if settings is None:
+        settings = load_settings()
 
     # Get the gzip files
-    goa_url = 'http://current.geneontology.org/annotations/'
-    urls = goa_files(goa_url)
+    urls = goa_files(settings.goa_index_url)
 
     # Set a client session and get the bucket
-    bucket = create_session(PROJECT, BUCKET_NAME)
+    bucket = create_session(settings.project, settings.bucket_name)
 
     # Extract the tar files
     for url in urls:
         print(url)
-        goa_file_extract(url, bucket)
+        goa_file_extract(url, bucket, settings.sub_dir)
 
 
 if __name__ == '__main__':
-    PROJECT = 'tellic-dev'
-    BUCKET_NAME = 'tellic-dev'
-    SUB_DIR = 'GeneOntology'
     run()
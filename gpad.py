@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Streaming reader for the GPAD / GPI annotation formats published next to
+the GAF files at http://current.geneontology.org/
+
+GPAD rows only carry the annotation itself; gene product attributes
+(symbol, name, synonyms, type, taxon) live once per entity in the GPI file.
+The GPI file is read once into a lookup table and GPAD rows are joined to
+it while streaming, producing rows in the goa.GAF_COLUMNS layout, so they
+can go anywhere GAF rows go (goa.batched / goa.load_rows,
+goa_store.build_store, ...).
+
+Both the 1.x and 2.0 layouts are supported; the version is taken from the
+!gpad-version / !gpi-version header and defaults to 1.1 / 1.2. GPAD 2.0
+relations are RO / BFO ids and are mapped to the GAF qualifier labels
+(RELATION_LABELS), and GPI 2.0 entity types are PR / SO / GO ids mapped to
+the GAF db_object_type labels (TYPE_LABELS), so 2.0 rows fingerprint and
+look up like GAF rows.
+
+GAF columns that GPAD does not carry are filled in when the data is given:
+    * evidence_code - GPAD uses ECO ids; pass an ECO -> GO evidence code map
+      (read_eco_mapping reads gaf-eco-mapping.txt) to get GAF codes
+    * aspect        - pass a GO id -> P/F/C map (aspects_from_graph builds
+      one from obo_funs.read_obo_nx)
+Without them the ECO id is kept and aspect is left empty.
+"""
+
+import collections
+
+from goa import LOGGER, batched, open_text
+
+
+# Normalized GPAD layout yielded by read_gpad_rows, for both versions
+GPAD_COLUMNS = ['db', 'db_object_id', 'qualifier', 'go_id', 'db_reference',
+                'eco_id', 'with_or_from', 'interacting_taxon', 'date',
+                'assigned_by', 'annotation_extension']
+
+Entity = collections.namedtuple('Entity', ['symbol', 'name', 'synonym',
+                                           'type', 'taxon'])
+
+# GPAD 2.0 relation ids -> GAF 2.2 / GPAD 1.1 qualifier labels; other ids
+# are passed through unchanged
+RELATION_LABELS = {
+    'RO:0002327': 'enables',
+    'RO:0002326': 'contributes_to',
+    'RO:0002331': 'involved_in',
+    'RO:0002263': 'acts_upstream_of',
+    'RO:0004034': 'acts_upstream_of_positive_effect',
+    'RO:0004035': 'acts_upstream_of_negative_effect',
+    'RO:0002264': 'acts_upstream_of_or_within',
+    'RO:0004032': 'acts_upstream_of_or_within_positive_effect',
+    'RO:0004033': 'acts_upstream_of_or_within_negative_effect',
+    'RO:0001025': 'located_in',
+    'BFO:0000050': 'part_of',
+    'RO:0002432': 'is_active_in',
+    'RO:0002325': 'colocalizes_with',
+}
+
+# GPI 2.0 entity type ids -> GAF / GPI 1.2 db_object_type labels; other ids
+# are passed through unchanged
+TYPE_LABELS = {
+    'PR:000000001': 'protein',
+    'CHEBI:36080': 'protein',
+    'GO:0032991': 'protein_complex',
+    'SO:0000704': 'gene',
+    'SO:0000673': 'transcript',
+    'SO:0000234': 'mRNA',
+    'SO:0000655': 'ncRNA',
+    'SO:0000252': 'rRNA',
+    'SO:0000253': 'tRNA',
+    'SO:0000274': 'snRNA',
+    'SO:0000275': 'snoRNA',
+    'SO:0000276': 'miRNA',
+    'SO:0001877': 'lnc_RNA',
+}
+
+NAMESPACE_ASPECTS = {'biological_process': 'P',
+                     'molecular_function': 'F',
+                     'cellular_component': 'C'}
+
+
+def _header_version(line, tag, default):
+    """Return the version from a '!gpad-version: 2.0' style header line"""
+    if line.startswith('!' + tag):
+        return line.split(':', 1)[1].strip()
+    return default
+
+
+def _split(line, num_columns):
+    row = line.rstrip('\r\n').split('\t')[:num_columns]
+    if len(row) < num_columns:
+        row.extend([''] * (num_columns - len(row)))
+    return row
+
+
+def _split_curie(curie):
+    """'UniProtKB:P12345' -> ('UniProtKB', 'P12345')"""
+    db, _, local_id = curie.partition(':')
+    return db, local_id
+
+
+def _taxon(value):
+    """NCBITaxon:9606 or taxon:9606 -> taxon:9606"""
+    if not value:
+        return ''
+    return 'taxon:' + value.split(':')[-1]
+
+
+# --- GPI ---------------------------------------------------------------------
+
+
+def read_gpi(f_in):
+    """
+    Read a GPI file into a {(db, db_object_id): Entity} lookup table. This
+    is the only part of the GPAD path that is held in memory.
+    """
+    version = '1.2'
+    entities = {}
+    for line in f_in:
+        if line[0] == '!':
+            version = _header_version(line, 'gpi-version', version)
+            continue
+        if not line.strip():
+            continue
+        if version.startswith('2'):
+            (curie, symbol, name, synonym, entity_type,
+             taxon) = _split(line, 6)
+            key = _split_curie(curie)
+            entity_type = TYPE_LABELS.get(entity_type, entity_type)
+        else:
+            (db, db_object_id, symbol, name, synonym, entity_type,
+             taxon) = _split(line, 7)
+            key = (db, db_object_id)
+        entities[key] = Entity(symbol, name, synonym, entity_type,
+                               _taxon(taxon))
+    LOGGER.info("Read %d GPI entities", len(entities))
+    return entities
+
+
+def load_gpi(path):
+    """read_gpi for a plain or gzipped file"""
+    with open_text(path) as f_in:
+        return read_gpi(f_in)
+
+
+# --- GPAD --------------------------------------------------------------------
+
+
+def read_gpad_rows(f_in):
+    """Yield GPAD annotations as lists in the GPAD_COLUMNS layout"""
+    version = '1.1'
+    for line in f_in:
+        if line[0] == '!':
+            version = _header_version(line, 'gpad-version', version)
+            continue
+        if not line.strip():
+            continue
+        if version.startswith('2'):
+            (curie, negation, relation, go_id, reference, eco_id,
+             with_or_from, interacting_taxon, date, assigned_by,
+             extension) = _split(line, 11)
+            db, db_object_id = _split_curie(curie)
+            relation = RELATION_LABELS.get(relation, relation)
+            qualifier = '|'.join(part for part in (negation, relation)
+                                 if part)
+        else:
+            (db, db_object_id, qualifier, go_id, reference, eco_id,
+             with_or_from, interacting_taxon, date, assigned_by,
+             extension) = _split(line, 11)
+        yield [db, db_object_id, qualifier, go_id, reference, eco_id,
+               with_or_from, interacting_taxon, date.replace('-', ''),
+               assigned_by, extension]
+
+
+def gpad_to_gaf_rows(annotations, entities, eco_map=None, aspects=None):
+    """
+    Join GPAD annotations to GPI entities and yield rows in the
+    goa.GAF_COLUMNS layout. Annotations whose entity is missing from the
+    GPI file are skipped.
+    """
+    eco_map = eco_map or {}
+    aspects = aspects or {}
+    missing = 0
+    for (db, db_object_id, qualifier, go_id, reference, eco_id, with_or_from,
+         interacting_taxon, date, assigned_by, extension) in annotations:
+        entity = entities.get((db, db_object_id))
+        if entity is None:
+            missing += 1
+            continue
+        taxon = entity.taxon
+        if interacting_taxon:
+            taxon += '|' + _taxon(interacting_taxon)
+        yield [db, db_object_id, entity.symbol, qualifier, go_id, reference,
+               eco_map.get(eco_id, eco_id), with_or_from,
+               aspects.get(go_id, ''), entity.name, entity.synonym,
+               entity.type, taxon, date, assigned_by, extension]
+    if missing:
+        LOGGER.warning("Skipped %d GPAD rows without a GPI entity", missing)
+
+
+def read_gpad_batches(gpad_path, gpi_path, batch_size, eco_map=None,
+                      aspects=None):
+    """
+    Yield lists of at most batch_size GAF_COLUMNS rows from a GPAD / GPI
+    pair, the GPAD equivalent of the goa.py GAF batch loop
+    """
+    entities = load_gpi(gpi_path)
+    with open_text(gpad_path) as f_in:
+        rows = gpad_to_gaf_rows(read_gpad_rows(f_in), entities, eco_map,
+                                aspects)
+        for batch in batched(rows, batch_size):
+            yield batch
+
+
+# --- Lookups for the columns GPAD does not carry -----------------------------
+
+
+def read_eco_mapping(f_in):
+    """
+    Read gaf-eco-mapping.txt (GO code, GO_REF or 'Default', ECO id) into an
+    {ECO id: GO evidence code} map, preferring the 'Default' rows
+    """
+    eco_map = {}
+    for line in f_in:
+        if line[0] == '#' or not line.strip():
+            continue
+        code, reference, eco_id = _split(line, 3)
+        if reference == 'Default' or eco_id not in eco_map:
+            eco_map[eco_id] = code
+    return eco_map
+
+
+def aspects_from_graph(graph):
+    """{GO id: P/F/C} from the namespaces of a read_obo_nx graph"""
+    return {node: NAMESPACE_ASPECTS[data['namespace']]
+            for node, data in graph.nodes(data=True)
+            if data.get('namespace') in NAMESPACE_ASPECTS}
+
@@ -18,11 +18,15 @@ import re
 
 import networkx
 
+from binary_sections import MappedSections, pad, uint32_bytes
+from pipeline_metrics import profile_hook
+
 import json
 import importlib
 import io
 import mimetypes
 import pathlib
+import struct
 
 
 try:
@@ -41,23 +45,30 @@ def read_obo(path, dtype):
     ______________________________
     path - Specific path to the OBO file. Can be either local path or URL
 
-    dtype - String. Options are: 'networkx' or 'dict'
+    dtype - String. Options are: 'networkx', 'dict' or 'frame'
         `networkx` - Function returns a NetworkX representation of the ontology
         `dict` - Function 4 python dictionaries:
                  typedefs - dictionary of relationship types in ontology
                  terms - nodes of ontology
                  instances - N/A
                  header - dictionary of metadata specified in the header
+        `frame` - Function returns 2 objects (see `read_obo_frame`):
+                 terms - pandas DataFrame, one row per term and one column
+                         per single-valued tag
+                 children - dictionary of DataFrames, one per multi-valued
+                            tag, keyed to terms by `term_index`
 
     Returns
     ______________________________
-    Ontology Structure in the form of either a netwrokx object or 4
-    dictionaries depending on the argument given for dtype.
+    Ontology Structure in the form of either a netwrokx object, 4
+    dictionaries or DataFrames depending on the argument given for dtype.
     '''
     if dtype == "networkx":
         return(read_obo_nx(path))
     elif dtype == "dict":
         return(read_obo_dict(path))
+    elif dtype == "frame":
+        return(read_obo_frame(path))
     else:
         print('Unrecognized data type {}'.format(dtype))
 
@@ -86,6 +97,211 @@ def save_json_nx(G, path):
         with open(str(path), 'w') as fp:
             json.dump(data1, fp)
 
+# --- Binary Graph Format -----------------------------------------------------
+#
+# Layout (all integers little-endian, every section padded to 4 bytes):
+#
+#   header      magic, version, section counts (see `binary_header`)
+#   strings     uint32 offsets (n_strings + 1) followed by a utf-8 blob of
+#               NUL terminated strings
+#   nodes       uint32 string id of every node id
+#   edges       uint32 arrays: source node, target node, key string id
+#   attributes  uint32 arrays: node, key string id, value; uint8 value kind
+#   graph       utf-8 JSON blob holding graph level attributes
+#
+# Node attribute values produced by `read_obo_nx` are strings or lists of
+# strings. Lists are stored as one attribute row per element so no nested
+# structure is needed; any other value is stored as a JSON string.
+
+binary_magic = b'OBOG'
+binary_version = 1
+binary_header = struct.Struct('<4sHHIIIII')
+
+ATTR_STR = 0
+ATTR_LIST = 1
+ATTR_EMPTY_LIST = 2
+ATTR_JSON = 3
+
+
+def save_binary_nx(G, path):
+    """
+    Write a networkx.MultiDiGraph (as returned by `read_obo_nx`) to the
+    compact binary graph format. Much faster to load than `save_json_nx`.
+    """
+    string_ids = {}
+    strings = []
+
+    def intern(value):
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    nodes = list(G.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    node_ids = [intern(str(node)) for node in nodes]
+
+    sources, targets, keys = [], [], []
+    for u, v, key in G.edges(keys=True):
+        sources.append(node_index[u])
+        targets.append(node_index[v])
+        keys.append(intern(str(key)))
+
+    attr_nodes, attr_keys, attr_kinds, attr_values = [], [], [], []
+    for i, (node, data) in enumerate(G.nodes(data=True)):
+        for key, value in data.items():
+            key_id = intern(key)
+            if isinstance(value, str):
+                rows = [(ATTR_STR, intern(value))]
+            elif isinstance(value, list) and not value:
+                rows = [(ATTR_EMPTY_LIST, 0)]
+            elif isinstance(value, list) and all(
+                    isinstance(item, str) for item in value):
+                rows = [(ATTR_LIST, intern(item)) for item in value]
+            else:
+                rows = [(ATTR_JSON, intern(json.dumps(value)))]
+            for kind, value_id in rows:
+                attr_nodes.append(i)
+                attr_keys.append(key_id)
+                attr_kinds.append(kind)
+                attr_values.append(value_id)
+
+    encoded = [string.encode('utf-8') + b'\0' for string in strings]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+    blob = b''.join(encoded)
+    graph_blob = json.dumps(G.graph).encode('utf-8')
+
+    sections = [
+        uint32_bytes(offsets), blob,
+        uint32_bytes(node_ids),
+        uint32_bytes(sources), uint32_bytes(targets), uint32_bytes(keys),
+        uint32_bytes(attr_nodes), uint32_bytes(attr_keys),
+        uint32_bytes(attr_values), bytes(attr_kinds),
+        graph_blob,
+    ]
+    with open(str(path), 'wb') as fp:
+        fp.write(binary_header.pack(
+            binary_magic, binary_version, 0, len(strings), len(nodes),
+            len(sources), len(attr_nodes), len(graph_blob)))
+        for section in sections:
+            fp.write(section)
+            fp.write(b'\0' * pad(len(section)))
+
+
+class BinaryGraph(object):
+    """
+    Read-only, memory-mapped view of a file written by `save_binary_nx`.
+
+    Nothing is decoded up front: node ids, edges and attributes are read
+    straight from the mapped file, so opening a large graph is cheap. Use
+    `to_networkx` to materialize a mutable graph.
+    """
+
+    def __init__(self, path):
+        self._file = MappedSections(path)
+        (magic, version, _flags, n_strings, n_nodes, n_edges,
+         n_attrs, graph_len) = self._file.header(binary_header)
+        if magic != binary_magic:
+            raise ValueError('{} is not a binary graph file'.format(path))
+        if version != binary_version:
+            raise ValueError(
+                'Unsupported binary graph version {}'.format(version))
+
+        self._string_offsets = self._file.uint32_section(n_strings + 1)
+        self._blob = self._file.bytes_section(self._string_offsets[-1])
+        self._node_ids = self._file.uint32_section(n_nodes)
+        self.sources = self._file.uint32_section(n_edges)
+        self.targets = self._file.uint32_section(n_edges)
+        self._edge_keys = self._file.uint32_section(n_edges)
+        self._attr_nodes = self._file.uint32_section(n_attrs)
+        self._attr_keys = self._file.uint32_section(n_attrs)
+        self._attr_values = self._file.uint32_section(n_attrs)
+        self._attr_kinds = self._file.bytes_section(n_attrs)
+        self.graph = json.loads(
+            bytes(self._file.bytes_section(graph_len)).decode('utf-8'))
+
+    def string(self, idx):
+        """Decode entry `idx` of the string table."""
+        start = self._string_offsets[idx]
+        end = self._string_offsets[idx + 1] - 1
+        return str(self._blob[start:end], 'utf-8')
+
+    def strings(self):
+        """Decode the whole string table in one pass."""
+        if not len(self._blob):
+            return []
+        return str(self._blob[:-1], 'utf-8').split('\0')
+
+    def __len__(self):
+        return len(self._node_ids)
+
+    def nodes(self, strings=None):
+        """Return the node ids in file order."""
+        if strings is None:
+            return [self.string(idx) for idx in self._node_ids]
+        return [strings[idx] for idx in self._node_ids]
+
+    def edges(self, strings=None):
+        """Yield (source, target, key) tuples."""
+        nodes = self.nodes(strings)
+        string = self.string if strings is None else strings.__getitem__
+        for u, v, key in zip(self.sources, self.targets, self._edge_keys):
+            yield nodes[u], nodes[v], string(key)
+
+    def node_attributes(self, strings=None):
+        """Return a list with the attribute dict of every node."""
+        string = self.string if strings is None else strings.__getitem__
+        data = [dict() for _ in range(len(self._node_ids))]
+        rows = zip(self._attr_nodes, self._attr_keys, self._attr_kinds,
+                   self._attr_values)
+        for node, key, kind, value in rows:
+            attrs = data[node]
+            key = string(key)
+            if kind == ATTR_STR:
+                attrs[key] = string(value)
+            elif kind == ATTR_LIST:
+                if key in attrs:
+                    attrs[key].append(string(value))
+                else:
+                    attrs[key] = [string(value)]
+            elif kind == ATTR_EMPTY_LIST:
+                attrs[key] = []
+            else:
+                attrs[key] = json.loads(string(value))
+        return data
+
+    def to_networkx(self):
+        """Return a networkx.MultiDiGraph equal to the one that was saved."""
+        strings = self.strings()
+        graph = networkx.MultiDiGraph(**self.graph)
+        graph.add_nodes_from(
+            zip(self.nodes(strings), self.node_attributes(strings)))
+        # add_edge is noticeably cheaper than add_edges_from for multigraphs
+        add_edge = graph.add_edge
+        for u, v, key in self.edges(strings):
+            add_edge(u, v, key=key)
+        return graph
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_binary_nx(path):
+    """
+    Return the networkx.MultiDiGraph stored at `path` by `save_binary_nx`.
+    """
+    with BinaryGraph(path) as binary_graph:
+        return binary_graph.to_networkx()
+
 # --- Helper Functions --------------------------------------------------------
 
 
@@ -212,31 +428,107 @@ def read_obo_nx(path_or_file):
     return graph
 
 
-def get_sections(lines):
+def read_obo_frame(path_or_file):
     """
-    Separates an obo file into stanzas and process.
-    Returns (typedefs, terms, instances, header) tuples
-    where `typedefs`, `terms`, and `instances` are lists of
-    dictionaries and `header` is a dictionary.
+    Return the [Term] stanzas of an ontology as columnar pandas data.
+
+    Returns (terms, children):
+        terms - DataFrame with one row per term (including obsolete terms),
+                indexed by `term_index`, with a column for every
+                single-valued tag in `term_tag_singularity`
+        children - dictionary mapping each multi-valued tag (is_a,
+                   synonym, xref, relationship, ...) to a DataFrame with
+                   `term_index` and `value` columns, one row per value
+
+    Column lists are filled straight from the tag lines while the file is
+    streamed, so no per-term dictionary is built.
+
+    Parameters
+    ==========
+    path_or_file : str or file
+        Path, URL, or open file object. If path or URL, compression is
+        inferred from the file extension.
+    """
+    import pandas
+
+    single_tags = [tag for tag, single in term_tag_singularity.items()
+                   if single]
+    columns = {tag: [] for tag in single_tags}
+    children = {}
+    num_terms = 0
+
+    obo_file = open_read_file(path_or_file)
+    for stanza_type, stanza_lines in iter_sections(obo_file):
+        if stanza_type != '[Term]':
+            continue
+        for column in columns.values():
+            column.append(None)
+        for line in stanza_lines:
+            if line.startswith('!'):
+                continue
+            tag, value, trailing_modifier, comment = parse_tag_line(line)
+            column = columns.get(tag)
+            if column is not None:
+                column[num_terms] = value
+            else:
+                indexes, values = children.setdefault(tag, ([], []))
+                indexes.append(num_terms)
+                values.append(value)
+        num_terms += 1
+    obo_file.close()
+
+    index = pandas.RangeIndex(num_terms, name='term_index')
+    terms = pandas.DataFrame(columns, index=index, columns=single_tags)
+    child_frames = {
+        tag: pandas.DataFrame({'term_index': indexes, 'value': values},
+                              columns=['term_index', 'value'])
+        for tag, (indexes, values) in children.items()}
+    return terms, child_frames
+
+
+stanza_types = ('[Typedef]', '[Term]', '[Instance]')
+
+
+def iter_sections(lines):
+    """
+    Separates an obo file into stanzas without parsing them.
+    Yields (stanza_type, stanza_lines) tuples where `stanza_type` is
+    one of `stanza_types`, or None for the header.
     """
-    typedefs, terms, instances = [], [], []
     groups = itertools.groupby(lines, lambda line: line.strip() == '')
     for is_blank, stanza_lines in groups:
         if is_blank:
             continue
         stanza_type_line = next(stanza_lines)
         stanza_lines = list(stanza_lines)
-        if stanza_type_line.startswith('[Typedef]'):
+        for stanza_type in stanza_types:
+            if stanza_type_line.startswith(stanza_type):
+                yield stanza_type, stanza_lines
+                break
+        else:
+            yield None, [stanza_type_line] + stanza_lines
+
+
+@profile_hook('get_sections')
+def get_sections(lines):
+    """
+    Separates an obo file into stanzas and process.
+    Returns (typedefs, terms, instances, header) tuples
+    where `typedefs`, `terms`, and `instances` are lists of
+    dictionaries and `header` is a dictionary.
+    """
+    typedefs, terms, instances = [], [], []
+    for stanza_type, stanza_lines in iter_sections(lines):
+        if stanza_type == '[Typedef]':
             typedef = parse_stanza(stanza_lines, typedef_tag_singularity)
             typedefs.append(typedef)
-        elif stanza_type_line.startswith('[Term]'):
+        elif stanza_type == '[Term]':
             term = parse_stanza(stanza_lines, term_tag_singularity)
             terms.append(term)
-        elif stanza_type_line.startswith('[Instance]'):
+        elif stanza_type == '[Instance]':
             instance = parse_stanza(stanza_lines, instance_tag_singularity)
             instances.append(instance)
         else:
-            stanza_lines = [stanza_type_line] + stanza_lines
             header = parse_stanza(stanza_lines, header_tag_singularity)
     return typedefs, terms, instances, header
 
@@ -251,7 +543,7 @@ def parse_tag_line(line):
     Take a line representing a single tag-value pair and parse
     the line into (tag, value, trailing_modifier, comment).
     """
-    match = re.match(tag_line_pattern, line)
+    match = tag_line_pattern.match(line)
     if match is None:
         message = 'Tag-value pair parsing failed for:\n{}'.format(line)
         raise ValueError(message)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Per-stage pipeline metrics and opt-in profiling hooks.
+
+Every stage (download, decompress, parse, validate, serialize, upload,
+load, ...) records wall time, CPU time, peak RSS and optional row / byte
+counts, and is emitted as one JSON line. A stage that runs many times, such
+as the GAF batch loop, is also totalled in the summary line.
+
+Peak RSS is measured per stage on Linux by resetting the kernel's
+high-water mark (/proc/self/clear_refs) when a stage starts and reading
+VmHWM when it ends; an enclosing stage still reports the peak of the stages
+it contains. Where that is not possible peak_rss_mb is null and only
+process_peak_rss_mb, the high-water mark of the whole process so far, is
+available. Every line carries process_peak_rss_mb.
+
+JSON lines go to the file named by GO_METRICS_PATH, or to the logger when it
+is unset. Profiling is switched on per hook name:
+
+    GO_PROFILE=get_sections,gaf_batch   run the named hooks under cProfile,
+                                        ("all" profiles every hook)
+    GO_PROFILE_DIR=/tmp/profiles        where .pstats files are written
+                                        (one per hook, covering every call)
+    GO_TRACEMALLOC=1                    log the top allocations per hook
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+LOGGER = logging.getLogger('Gene Ontology Ingestion')
+
+TRACEMALLOC_TOP = 10
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+# Stages currently running, innermost last. The RSS high-water mark is per
+# process, so this is shared by every PipelineMetrics instance.
+_RUNNING = []
+
+# Highest high-water mark seen before a reset; resetting also lowers
+# ru_maxrss on Linux
+_PROCESS_PEAK = [0.0]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak / 1024.0 / 1024.0
+    return max(peak / 1024.0, _PROCESS_PEAK[0])
+
+
+def rss_high_water_mb():
+    """
+    RSS high-water mark since the last reset_rss_high_water() in MB, None
+    if /proc is not available
+    """
+    try:
+        with open(PROC_STATUS) as f_in:
+            for line in f_in:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def reset_rss_high_water():
+    """Reset the RSS high-water mark to the current RSS (Linux only)"""
+    peak = rss_high_water_mb()
+    if peak is None:
+        return False
+    _PROCESS_PEAK[0] = max(_PROCESS_PEAK[0], peak)
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f_out:
+            f_out.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+class Stage(object):
+    """Measurements for one run of a stage; add() counts rows and bytes"""
+
+    def __init__(self, name, rows=0, num_bytes=0):
+        self.name = name
+        self.rows = rows
+        self.bytes = num_bytes
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_rss = None
+
+    def add(self, rows=0, num_bytes=0):
+        self.rows += rows
+        self.bytes += num_bytes
+
+    def add_peak_rss(self, peak):
+        if peak is not None:
+            self.peak_rss = max(peak, self.peak_rss or 0.0)
+
+    def record(self):
+        record = {'stage': self.name,
+                  'wall_sec': round(self.wall, 6),
+                  'cpu_sec': round(self.cpu, 6),
+                  'rows': self.rows,
+                  'bytes': self.bytes,
+                  'peak_rss_mb': (None if self.peak_rss is None
+                                  else round(self.peak_rss, 1))}
+        if self.wall > 0:
+            record['rows_per_sec'] = round(self.rows / self.wall, 2)
+            record['bytes_per_sec'] = round(self.bytes / self.wall, 2)
+        return record
+
+
+class PipelineMetrics(object):
+    """Collects stage metrics for one pipeline run and emits JSON lines"""
+
+    def __init__(self, pipeline, path=None):
+        self.pipeline = pipeline
+        self.path = path or os.environ.get('GO_METRICS_PATH')
+        self.totals = {}
+
+    def emit(self, event, record):
+        record = dict(record, pipeline=self.pipeline, event=event,
+                      time=round(time.time(), 3),
+                      process_peak_rss_mb=peak_rss_mb())
+        line = json.dumps(record, sort_keys=True)
+        if self.path:
+            with open(self.path, 'a') as f_out:
+                f_out.write(line + '\n')
+        else:
+            LOGGER.info("metrics %s", line)
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0, num_bytes=0):
+        """
+        Time the body of a with-block as stage `name`:
+
+            with METRICS.stage('download') as stage:
+                ...
+                stage.add(num_bytes=os.path.getsize(dest))
+        """
+        stage = Stage(name, rows, num_bytes)
+        if _RUNNING:
+            # Keep the enclosing stage's peak before the mark is reset
+            _RUNNING[-1].add_peak_rss(rss_high_water_mb())
+        per_stage_rss = reset_rss_high_water()
+        _RUNNING.append(stage)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall = time.perf_counter() - start_wall
+            stage.cpu = time.process_time() - start_cpu
+            _RUNNING.remove(stage)
+            if per_stage_rss:
+                stage.add_peak_rss(rss_high_water_mb())
+                if _RUNNING:
+                    _RUNNING[-1].add_peak_rss(stage.peak_rss)
+            else:
+                stage.peak_rss = None
+            total = self.totals.setdefault(name, Stage(name))
+            total.add(stage.rows, stage.bytes)
+            total.add_peak_rss(stage.peak_rss)
+            total.wall += stage.wall
+            total.cpu += stage.cpu
+            self.emit('stage', stage.record())
+
+    def summary(self):
+        """Emit one line with the totals of every stage seen so far"""
+        self.emit('summary', {'stages': [total.record()
+                                         for total in self.totals.values()]})
+
+    def timed(self, func):
+        """Decorator: run func as a stage named after it, then summarize"""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with self.stage(func.__name__):
+                    return func(*args, **kwargs)
+            finally:
+                self.summary()
+
+        return wrapper
+
+
+# One profiler per hook name, so a hook that runs once per batch collects
+# every batch of the run
+_PROFILES = {}
+
+
+def _profiling(name):
+    wanted = os.environ.get('GO_PROFILE', '')
+    names = {item.strip() for item in wanted.split(',') if item.strip()}
+    return name in names or 'all' in names
+
+
+@contextlib.contextmanager
+def profiled(name):
+    """
+    Profile the body of a with-block when enabled for `name` through
+    GO_PROFILE / GO_TRACEMALLOC. Costs nothing when profiling is off.
+    """
+    profile = None
+    if _profiling(name):
+        profile = _PROFILES.setdefault(name, cProfile.Profile())
+    trace = bool(os.environ.get('GO_TRACEMALLOC'))
+    started_trace = trace and not tracemalloc.is_tracing()
+    if started_trace:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot() if trace else None
+    if profile is not None:
+        profile.enable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile_dir = os.environ.get('GO_PROFILE_DIR', '.')
+            stats_file = os.path.join(
+                profile_dir, '{}.{}.pstats'.format(name, os.getpid()))
+            # Rewritten after every call with the stats of all calls so far
+            profile.dump_stats(stats_file)
+            LOGGER.debug("Wrote %s profile to %s", name, stats_file)
+        if trace:
+            after = tracemalloc.take_snapshot()
+            for stat in after.compare_to(before, 'lineno')[:TRACEMALLOC_TOP]:
+                LOGGER.info("tracemalloc %s: %s", name, stat)
+            if started_trace:
+                tracemalloc.stop()
+
+
+def profile_hook(name):
+    """Decorator form of profiled() for hot functions"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiled(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Pipeline settings shared by the scripts and go_cli.py. Every value can be
+overridden with a GO_* environment variable (GO_PROJECT, GO_BUCKET_NAME,
+GO_NUM_LINES, ...) or a command line flag. Only the standard library is
+imported here so reading settings stays cheap.
+"""
+
+import collections
+import os
+
+
+DEFAULTS = collections.OrderedDict([
+    ('project', 'tellic-dev'),
+    ('bucket_name', 'tellic-dev'),
+    ('sub_dir', 'GeneOntology'),
+    ('dataset', 'GeneOntology'),
+    ('gaf_table', 'GAF_files'),
+    ('delta_table', 'GAF_annotations'),
+    ('fingerprint_dir', '.'),
+    ('ontology_table', 'GO_relational'),
+    ('num_lines', 50000),
+    ('goa_index_url', 'http://current.geneontology.org/annotations/'),
+    ('goa_url',
+     'http://current.geneontology.org/annotations/goa_human.gaf.gz'),
+    ('obo_url', 'http://current.geneontology.org/ontology/go.obo'),
+    ('ontology_file', 'GO.tsv'),
+    ('generif_table', 'GeneRIF_GO'),
+    ('generif_url',
+     'https://ftp.ncbi.nih.gov/gene/GeneRIF/generifs_basic.gz'),
+    ('idmapping_url',
+     'https://ftp.uniprot.org/pub/databases/uniprot/current_release/'
+     'knowledgebase/idmapping/by_organism/HUMAN_9606_idmapping.dat.gz'),
+    ('taxon', '9606'),
+])
+
+Settings = collections.namedtuple('Settings', list(DEFAULTS))
+
+
+def _destination(settings, table):
+    return settings.dataset + '.' + table
+
+
+def gaf_destination(settings):
+    """BigQuery table the GAF rows are appended to"""
+    return _destination(settings, settings.gaf_table)
+
+
+def delta_destination(settings):
+    """BigQuery table maintained by delta loads (goa_delta.py)"""
+    return _destination(settings, settings.delta_table)
+
+
+def ontology_destination(settings):
+    """BigQuery table the ontology terms are written to"""
+    return _destination(settings, settings.ontology_table)
+
+
+def generif_destination(settings):
+    """BigQuery table the GeneRIF / GO join is written to"""
+    return _destination(settings, settings.generif_table)
+
+
+def load_settings(**overrides):
+    """
+    Return Settings from DEFAULTS, GO_* environment variables and then
+    overrides (None values are ignored)
+    """
+    values = {}
+    for name, default in DEFAULTS.items():
+        value = os.environ.get('GO_' + name.upper(), default)
+        if overrides.get(name) is not None:
+            value = overrides[name]
+        values[name] = type(default)(value)
+    return Settings(**values)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Deterministic generators for synthetic OBO and GAF files, used by
+benchmark.py. The same seed and shape always produce byte-identical output,
+so timings from different runs and machines are comparable.
+
+Usage:
+    python synthetic.py obo go_synthetic.obo 50000
+    python synthetic.py gaf goa_synthetic.gaf.gz 500000
+"""
+
+import gzip
+import io
+import random
+import sys
+
+
+NAMESPACES = ['biological_process', 'molecular_function',
+              'cellular_component']
+ASPECTS = {'biological_process': 'P', 'molecular_function': 'F',
+           'cellular_component': 'C'}
+RELATIONSHIPS = ['part_of', 'regulates', 'negatively_regulates',
+                 'positively_regulates']
+EVIDENCE_CODES = ['IEA', 'IBA', 'IDA', 'IPI', 'TAS', 'IMP', 'ISS', 'NAS']
+# Rough share of each evidence code in goa_human
+EVIDENCE_WEIGHTS = [45, 20, 12, 10, 5, 4, 2, 2]
+SYNONYM_SCOPES = ['EXACT', 'BROAD', 'NARROW', 'RELATED']
+
+
+def _words(rng, count):
+    return ' '.join('w{}'.format(rng.randrange(5000)) for _ in range(count))
+
+
+def term_id(i):
+    return 'GO:{:07d}'.format(i + 1)
+
+
+def generate_obo(f_out, num_terms=10000, seed=0, max_parents=3,
+                 relationship_rate=0.3, synonyms=2, xrefs=1,
+                 obsolete_rate=0.02):
+    """
+    Write a synthetic OBO ontology to the text stream f_out.
+
+    Terms form a DAG: every term except the roots gets 1..max_parents is_a
+    parents chosen among earlier terms. relationship_rate is the chance of
+    an extra relationship line, synonyms / xrefs are the mean number of
+    those tags per term.
+    """
+    rng = random.Random(seed)
+    f_out.write('format-version: 1.2\n')
+    f_out.write('data-version: synthetic/{}-{}\n'.format(num_terms, seed))
+    f_out.write('ontology: go\n')
+    f_out.write('subsetdef: goslim_generic "Generic GO slim"\n')
+    f_out.write('synonymtypedef: systematic_synonym "Systematic synonym" '
+                'EXACT\n')
+    f_out.write('\n')
+
+    for i in range(num_terms):
+        namespace = NAMESPACES[i % len(NAMESPACES)]
+        f_out.write('[Term]\n')
+        f_out.write('id: {}\n'.format(term_id(i)))
+        f_out.write('name: {}\n'.format(_words(rng, rng.randint(2, 6))))
+        f_out.write('namespace: {}\n'.format(namespace))
+        f_out.write('def: "{}." [GOC:synthetic]\n'.format(
+            _words(rng, rng.randint(5, 25))))
+        for _ in range(rng.randint(0, 2 * synonyms)):
+            f_out.write('synonym: "{}" {} []\n'.format(
+                _words(rng, rng.randint(1, 4)), rng.choice(SYNONYM_SCOPES)))
+        for _ in range(rng.randint(0, 2 * xrefs)):
+            f_out.write('xref: Reactome:R-HSA-{}\n'.format(
+                rng.randrange(10 ** 6)))
+        if rng.random() < obsolete_rate:
+            f_out.write('is_obsolete: true\n\n')
+            continue
+        # The first term of each namespace is its root
+        if i >= len(NAMESPACES):
+            candidates = range(i % len(NAMESPACES), i, len(NAMESPACES))
+            parents = rng.sample(candidates,
+                                 min(len(candidates),
+                                     rng.randint(1, max_parents)))
+            for parent in sorted(parents):
+                f_out.write('is_a: {} ! parent\n'.format(term_id(parent)))
+            if rng.random() < relationship_rate:
+                f_out.write('relationship: {} {} ! related\n'.format(
+                    rng.choice(RELATIONSHIPS),
+                    term_id(rng.choice(candidates))))
+        f_out.write('\n')
+
+    for relationship in RELATIONSHIPS:
+        f_out.write('[Typedef]\n')
+        f_out.write('id: {}\n'.format(relationship))
+        f_out.write('name: {}\n'.format(relationship.replace('_', ' ')))
+        f_out.write('is_transitive: true\n\n')
+
+
+def generate_gaf(f_out, num_rows=100000, num_genes=20000, num_terms=10000,
+                 seed=0, header_lines=30):
+    """
+    Write synthetic GAF 2.1 rows to the text stream f_out.
+
+    Gene popularity is skewed (a few genes carry many annotations, as in
+    real GAF files) and evidence codes follow EVIDENCE_WEIGHTS.
+    """
+    rng = random.Random(seed)
+    f_out.write('!gaf-version: 2.1\n')
+    for i in range(header_lines - 1):
+        f_out.write('!synthetic header line {}\n'.format(i))
+
+    for _ in range(num_rows):
+        gene = int(num_genes * rng.random() ** 3)
+        term = rng.randrange(num_terms)
+        namespace = NAMESPACES[term % len(NAMESPACES)]
+        evidence = rng.choices(EVIDENCE_CODES, EVIDENCE_WEIGHTS)[0]
+        row = ['UniProtKB',
+               'P{:05d}'.format(gene),
+               'GENE{}'.format(gene),
+               'NOT' if rng.random() < 0.02 else '',
+               term_id(term),
+               'PMID:{}'.format(rng.randrange(10 ** 8)),
+               evidence,
+               'UniProtKB:Q{:05d}'.format(rng.randrange(num_genes))
+               if evidence == 'IPI' else '',
+               ASPECTS[namespace],
+               'Synthetic protein {}'.format(gene),
+               'SYN{}|ALT{}'.format(gene, gene),
+               'protein',
+               'taxon:9606',
+               '2019{:02d}{:02d}'.format(rng.randint(1, 12),
+                                         rng.randint(1, 28)),
+               rng.choice(['UniProt', 'GO_Central', 'Reactome']),
+               '',
+               '']
+        f_out.write('\t'.join(row) + '\n')
+
+
+def write_obo(path, **kwargs):
+    with _open_write(path) as f_out:
+        generate_obo(f_out, **kwargs)
+    return path
+
+
+def write_gaf(path, **kwargs):
+    with _open_write(path) as f_out:
+        generate_gaf(f_out, **kwargs)
+    return path
+
+
+def _open_write(path):
+    if str(path).endswith('.gz'):
+        # mtime=0 keeps compressed output byte-identical between runs
+        return io.TextIOWrapper(gzip.GzipFile(path, 'wb', mtime=0),
+                                encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+if __name__ == '__main__':
+    KIND, PATH, SIZE = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    if KIND == 'obo':
+        write_obo(PATH, num_terms=SIZE)
+    else:
+        write_gaf(PATH, num_rows=SIZE)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Tests for goa_delta.delta_load. BigQuery is replaced by an in-memory
+table behind a fake bigquery.Client, so the real delete_fingerprints runs,
+including the NotFound raised for a table that does not exist yet.
+
+Usage:
+    python -m pytest test_goa_delta.py
+"""
+
+import os
+
+import pytest
+
+bigquery = pytest.importorskip('google.cloud.bigquery')
+from google.api_core.exceptions import NotFound  # noqa: E402
+
+import goa_delta  # noqa: E402
+import synthetic  # noqa: E402
+from pipeline_metrics import PipelineMetrics  # noqa: E402
+from settings import load_settings  # noqa: E402
+
+
+DESTINATION = 'GeneOntology.GAF_annotations'
+
+
+class FakeTable(object):
+    """Fingerprints of the rows in the delta table, None until created"""
+
+    def __init__(self):
+        self.rows = None
+        self.deletes = 0
+        self.fail_after = None
+
+
+class FakeClient(object):
+    table = None
+
+    def __init__(self, project=None):
+        self.project = project
+
+    def get_table(self, name):
+        if self.table.rows is None:
+            raise NotFound('Not found: Table {}'.format(name))
+        return name
+
+    def query(self, query, job_config=None):
+        assert query.startswith('DELETE FROM `{}`'.format(DESTINATION))
+        if self.table.rows is None:
+            raise NotFound('Not found: Table {}'.format(DESTINATION))
+        doomed = set(job_config.query_parameters[0].values)
+        self.table.rows = [row for row in self.table.rows
+                           if row not in doomed]
+        self.table.deletes += 1
+        return self
+
+    def result(self):
+        return None
+
+
+@pytest.fixture
+def table(monkeypatch):
+    fake = FakeTable()
+
+    def load_rows(rows, column_names, destination_table, project, metrics):
+        assert column_names == goa_delta.DELTA_COLUMNS
+        loaded = len(fake.rows or [])
+        if fake.fail_after is not None and loaded >= fake.fail_after:
+            raise IOError('load job failed')
+        fake.rows = (fake.rows or []) + [row[-1] for row in rows]
+
+    FakeClient.table = fake
+    monkeypatch.setattr(bigquery, 'Client', FakeClient)
+    monkeypatch.setattr(goa_delta, 'load_rows', load_rows)
+    return fake
+
+
+def _release(tmp_path, name, num_rows, seed=0):
+    path = str(tmp_path / name / 'goa_human.gaf.gz')
+    os.makedirs(os.path.dirname(path))
+    return synthetic.write_gaf(path, num_rows=num_rows, num_genes=500,
+                               num_terms=300, seed=seed)
+
+
+def _delta_load(path, tmp_path):
+    settings = load_settings(fingerprint_dir=str(tmp_path), num_lines=500)
+    metrics = PipelineMetrics('test', path=os.devnull)
+    return goa_delta.delta_load(path, settings, metrics, DESTINATION)
+
+
+def _fingerprints(path):
+    return {goa_delta.fingerprint_hex(value)
+            for value in goa_delta.load_fingerprints(path)}
+
+
+def test_first_run_without_delta_table(table, tmp_path):
+    path = _release(tmp_path, 'first', 2000)
+    added, removed = _delta_load(path, tmp_path)
+
+    assert removed == 0
+    assert added == len(table.rows) == len(set(table.rows))
+    assert table.deletes == 0
+    fingerprint_path = goa_delta.fingerprint_path_for(path, str(tmp_path))
+    assert _fingerprints(fingerprint_path) == set(table.rows)
+
+
+def test_next_release_applies_only_the_difference(table, tmp_path):
+    _delta_load(_release(tmp_path, 'first', 2000, seed=1), tmp_path)
+    path = _release(tmp_path, 'second', 2000, seed=2)
+    added, removed = _delta_load(path, tmp_path)
+
+    assert added and removed
+    fingerprint_path = goa_delta.fingerprint_path_for(path, str(tmp_path))
+    assert sorted(table.rows) == sorted(_fingerprints(fingerprint_path))
+
+
+def test_failed_run_can_be_repeated(table, tmp_path):
+    path = _release(tmp_path, 'first', 2000)
+    table.fail_after = 500
+    with pytest.raises(IOError):
+        _delta_load(path, tmp_path)
+    assert table.rows
+
+    table.fail_after = None
+    _delta_load(path, tmp_path)
+    fingerprint_path = goa_delta.fingerprint_path_for(path, str(tmp_path))
+    assert sorted(table.rows) == sorted(_fingerprints(fingerprint_path))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2019 tellic LLC. All rights reserved.
+
+Jira Ticket: TELLIC-523 - ETL the OMIM, Gene Ontology, +1Data
+
+Description:
+Tests for goa_download.download_file against a local HTTP server.
+
+Usage:
+    python -m pytest test_goa_download.py
+"""
+
+import hashlib
+import http.server
+import re
+import threading
+
+import pytest
+
+import goa_download
+
+
+PAYLOAD = bytes(range(256)) * 400
+SEGMENT_SIZE = 10000
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves PAYLOAD, honouring Range unless the server says otherwise"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        match = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('Range', ''))
+        if not match or not server.ranges:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+            return
+
+        start, end = int(match.group(1)), int(match.group(2))
+        body = PAYLOAD[start:end + 1]
+        with server.lock:
+            server.range_requests.append((start, end))
+            short = start > 0 and server.short_segments > 0
+            if short:
+                server.short_segments -= 1
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+            start, end, len(PAYLOAD)))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # Drop the connection half way through the segment
+        self.wfile.write(body[:len(body) // 2] if short else body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(goa_download.time, 'sleep', lambda seconds: None)
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.ranges = True
+    httpd.short_segments = 0
+    httpd.range_requests = []
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(httpd):
+    return 'http://127.0.0.1:{}/goa_human.gaf.gz'.format(httpd.server_port)
+
+
+def _download(httpd, tmp_path, **kwargs):
+    dest = str(tmp_path / 'goa_human.gaf.gz')
+    goa_download.download_file(_url(httpd), dest, segments=4,
+                               min_segment_size=SEGMENT_SIZE, **kwargs)
+    with open(dest, 'rb') as f_in:
+        return f_in.read()
+
+
+def test_segmented_download(server, tmp_path):
+    assert _download(server, tmp_path) == PAYLOAD
+    segments = [request for request in server.range_requests
+                if request != (0, 0)]
+    assert len(segments) == 4
+    assert sum(end - start + 1 for start, end in segments) == len(PAYLOAD)
+
+
+def test_range_ignored_falls_back_to_single_stream(server, tmp_path):
+    server.ranges = False
+    assert _download(server, tmp_path) == PAYLOAD
+    assert server.range_requests == []
+
+
+def test_short_segment_is_retried(server, tmp_path):
+    server.short_segments = 2
+    assert _download(server, tmp_path) == PAYLOAD
+    assert server.short_segments == 0
+    # probe + 4 segments + 2 retries
+    assert len(server.range_requests) == 7
+
+
+def test_failed_segment_raises_after_retries(server, tmp_path):
+    server.short_segments = 100
+    with pytest.raises(IOError, match='short'):
+        _download(server, tmp_path, retries=1)
+
+
+def test_checksum(server, tmp_path):
+    digest = hashlib.md5(PAYLOAD).hexdigest()
+    assert _download(server, tmp_path, checksum=digest.upper()) == PAYLOAD
+    with pytest.raises(IOError, match='checksum mismatch'):
+        _download(server, tmp_path, checksum='0' * 32)